@@ -1,10 +1,14 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import ast
+import os
 import random
 from datetime import datetime
-import base64
-from pathlib import Path
+
+from assets import build_assets
+from places_store import DATA_FILE, PlacesStore
+from planner import MAX_STOPS, slot_labels
 
 # Page configuration
 st.set_page_config(
@@ -14,74 +18,99 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# --- HELPER FUNCTION TO ENCODE IMAGE ---
-def img_to_base64(img_path):
-    try:
-        img_bytes = Path(img_path).read_bytes()
-        encoded = base64.b64encode(img_bytes).decode()
-        return encoded
-    except FileNotFoundError:
-        return None
+# --- SIDEBAR IMAGE ---
+# Variants are built once per process and served from static/ by URL
+# (server.enableStaticServing), so reruns only re-send a short <img> tag.
+# Point PLACES_STATIC_URL at the API's /static to get long-lived caching.
+STATIC_URL = os.environ.get('PLACES_STATIC_URL', 'app/static').rstrip('/')
 
-# --- DATA LOADER WITH TYPE SANITIZATION ---
-@st.cache_data
-def load_data():
-    # Try reading main CSV, fallback to alternate
-    try:
-        df = pd.read_csv('places_expand.csv')
-    except FileNotFoundError:
-        df = pd.read_csv('places.csv', encoding='ISO-8859-1')
-        if 'subcategory' not in df.columns and 'category' in df.columns:
-            df['subcategory'] = df['category']
-
-    # Standardize column names (strip spaces)
-    df.columns = [c.strip() for c in df.columns]
-
-    # Ensure required columns exist
-    required_cols = [
-        'place_name', 'category', 'subcategory', 'description', 'location',
-        'best_time_to_visit', 'facts', 'rules', 'spooky',
-        'distance_from_pune_km', 'id', 'map_link'
-    ]
-    for col in required_cols:
-        if col not in df.columns:
-            df[col] = pd.NA
-
-    # Coerce distance to numeric (extract numeric part if values like '25 km')
-    df['distance_from_pune_km'] = (
-        pd.to_numeric(
-            df['distance_from_pune_km']
-            .astype(str)
-            .str.extract(r'([0-9]*\.?[0-9]+)', expand=False),
-            errors='coerce'
-        )
-        .astype(float)
+@st.cache_resource
+def sidebar_image_html(img_path):
+    files = build_assets(img_path)
+    if not files:
+        return None
+    if 'jpeg' not in files:
+        return f'<img src="{STATIC_URL}/{files["original"]}" alt="Pune Hidden Gem" style="width: 100%; object-fit: cover; border-radius: 10px;">'
+    return (
+        f'<picture>'
+        f'<source type="image/webp" srcset="{STATIC_URL}/{files["webp"]}">'
+        f'<img src="{STATIC_URL}/{files["jpeg"]}" alt="Pune Hidden Gem" style="width: 100%; object-fit: cover; border-radius: 10px;">'
+        f'</picture>'
     )
 
-    # Normalize spooky to boolean
-    df['spooky'] = (
-        df['spooky']
-        .astype(str)
-        .str.strip()
-        .str.lower()
-        .isin(['true', '1', 'yes', 'y'])
-    )
+# --- DATA ---
+# Loading, type sanitization, the snapshot and the filter/search/planner
+# indexes come from places_store, the same layer the API uses. One store per
+# process, shared across sessions; it reloads when the CSV changes.
+@st.cache_resource
+def load_store():
+    return PlacesStore(DATA_FILE)
+
+def load_data():
+    return load_store().current()
 
-    # Fill text columns to avoid NaN issues in .str.contains
-    text_cols = [
-        'best_time_to_visit', 'category', 'subcategory', 'description',
-        'location', 'facts', 'rules', 'place_name', 'map_link'
-    ]
-    for c in text_cols:
-        df[c] = df[c].fillna('')
-
-    # Ensure id is present and usable
-    if 'id' in df.columns and df['id'].notna().any():
-        df['id'] = df['id'].astype(str).fillna('')
+# ``version`` only keys the caches below to the loaded data version
+@st.cache_resource
+def sidebar_options(version):
+    df = load_data().df
+    categories = sorted([c for c in df['category'].dropna().unique()])
+    subcategories = {
+        category: sorted([s for s in group.dropna().unique()])
+        for category, group in df.groupby('category', observed=True)['subcategory']
+    }
+    # Distance slider guard
+    max_distance_available = df['distance_from_pune_km'].dropna()
+    if not max_distance_available.empty:
+        max_dist_val = int(max_distance_available.max())
     else:
-        df['id'] = (df['place_name'].fillna('').str[:20] + '_' + df.index.astype(str))
+        max_dist_val = 100
+    return categories, subcategories, max_dist_val
 
-    return df
+# Number of distinct filter combinations whose results are kept
+FILTER_CACHE_SIZE = 256
+
+SPOOKY_FILTERS = {
+    "All places": None,
+    "Only spooky places": True,
+    "Only non-spooky places": False,
+}
+
+@st.cache_resource(max_entries=FILTER_CACHE_SIZE, show_spinner=False)
+def filter_summary(version, categories, subcategories, max_distance, spooky):
+    """Filtered places plus the metrics and breakdowns shown above them
+
+    Arguments are the normalized filter tuple, so every rerun with the same
+    filters is served from the cache. The result is shared between sessions
+    and must be treated as read-only.
+    """
+    data = load_data()
+    df = data.df
+    positions = data.index.select(
+        categories=list(categories),
+        subcategories=list(subcategories) or None,
+        max_distance=max_distance,
+        spooky=spooky,
+    )
+    filtered_df = df.iloc[positions]
+    distances = filtered_df['distance_from_pune_km'].dropna()
+    return {
+        'df': filtered_df,
+        'count': len(filtered_df),
+        'spooky_count': int(filtered_df['spooky'].sum()),
+        'avg_distance': float(distances.mean()) if len(distances) else None,
+        'max_distance': float(distances.max()) if len(distances) else None,
+        'category_counts': [(c, n) for c, n in filtered_df['category'].value_counts().items() if n],
+        'top_subcategories': [(s, n) for s, n in filtered_df['subcategory'].value_counts().items() if n][:10],
+    }
+
+@st.cache_data(max_entries=FILTER_CACHE_SIZE, show_spinner=False)
+def facet_counts(version, categories, subcategories, max_distance, spooky):
+    """Counts shown next to the sidebar options, from the shared facet engine
+
+    Each option's count is what the results would be with it picked, given
+    the other current filters.
+    """
+    return load_data().facets(list(categories) or None, max_distance, spooky, list(subcategories) or None)
 
 # Category Icons
 CATEGORY_ICONS = {
@@ -109,76 +138,169 @@ SECRET_TIPS = [
 ]
 
 # Weekend Picks
-def get_weekend_picks(df, num_picks=3):
+@st.cache_resource
+def weekend_candidates(version, num_picks=3):
+    """Row positions weekend picks are drawn from"""
+    df = load_data().df
     # NaN-safe contains and distance handling
-    weekend_places = df[
+    weekend_places = (
         (df['best_time_to_visit'].str.contains('Anytime', case=False, na=False)) |
         (df['best_time_to_visit'].str.contains('Evening', case=False, na=False)) |
         (df['best_time_to_visit'].str.contains('Sunset', case=False, na=False)) |
         (df['distance_from_pune_km'].fillna(float('inf')) <= 30)
-    ]
-    if len(weekend_places) >= num_picks:
-        return weekend_places.sample(n=num_picks, random_state=random.randint(0, 10_000))
+    ).to_numpy()
+    if weekend_places.sum() >= num_picks:
+        return np.flatnonzero(weekend_places)
     # Fallback to any places with valid numeric distance first, else any
-    fallback = df.dropna(subset=['distance_from_pune_km'])
-    if len(fallback) >= num_picks:
-        return fallback.sample(n=num_picks, random_state=random.randint(0, 10_000))
-    return df.sample(n=min(num_picks, len(df)), random_state=random.randint(0, 10_000))
+    fallback = df['distance_from_pune_km'].notna().to_numpy()
+    if fallback.sum() >= num_picks:
+        return np.flatnonzero(fallback)
+    return np.arange(len(df))
+
+def get_weekend_picks(data, num_picks=3):
+    # Draw row positions, then slice just those rows
+    picks = data.sampler.sample(weekend_candidates(data.version, num_picks), num_picks)
+    return data.df.iloc[picks]
+
+@st.cache_data(max_entries=FILTER_CACHE_SIZE, show_spinner=False)
+def plan_weekend(version, categories, spooky, hours, max_stops):
+    """Ordered stops (row positions), their time-of-day labels and the route totals"""
+    data = load_data()
+    if categories:
+        positions = data.index.select(categories=list(categories), spooky=spooky)
+    else:
+        positions = data.index.select(spooky=spooky)
+    planner = data.planner
+    plan = planner.plan(positions, hours=hours, max_stops=max_stops)
+    plan['labels'] = slot_labels(planner.slots[plan['stops']].tolist())
+    return plan
 
 # Display Card
+CARD_FIELDS = [
+    'place_name', 'category', 'subcategory', 'description', 'location',
+    'best_time_to_visit', 'facts', 'rules', 'spooky', 'distance_from_pune_km',
+    'id', 'map_link'
+]
+
+# Result list display options
+PAGE_SIZE_OPTIONS = [5, 10, 20, 50]
+TABLE_COLUMNS = [
+    'place_name', 'category', 'subcategory', 'distance_from_pune_km', 'spooky',
+    'best_time_to_visit', 'location', 'map_link'
+]
+
+@st.cache_data(max_entries=4096, show_spinner=False)
+def card_markdown(fields):
+    """Markdown for one card's header, details and sidebar column
+
+    Keyed on the card's own field values, so an unchanged card is formatted
+    once no matter how many reruns show it.
+    """
+    place = dict(zip(CARD_FIELDS, fields))
+    icon = CATEGORY_ICONS.get(place['category'], '🏷️')
+    header = (
+        f"### 📍 {place['place_name']}\n\n"
+        f"**{icon} {place['category']}** • **{place['subcategory']}**"
+    )
+
+    details = []
+    if str(place.get('description', '')).strip():
+        details.append(f"**📖 Description:** {place['description']}")
+    if str(place.get('location', '')).strip():
+        details.append(f"**🌐 Location:** {place['location']}")
+    if str(place.get('best_time_to_visit', '')).strip():
+        details.append(f"**📅 Best time to visit:** {place['best_time_to_visit']}")
+    if str(place.get('facts', '')).strip():
+        details.append(f"**🧠 Interesting Fact:** {place['facts']}")
+    if str(place.get('rules', '')).strip():
+        details.append(f"**⚠️ Rules:** {place['rules']}")
+
+    spooky_status = "Yes 👻" if bool(place['spooky']) else "No 😊"
+    side = [f"**👻 Spooky?** {spooky_status}"]
+    dist_val = place.get('distance_from_pune_km')
+    if pd.notna(dist_val):
+        side.append(f"**📏 Distance:** {float(dist_val):.1f} km")
+    else:
+        side.append(f"**📏 Distance:** —")
+    side.append(f"**🆔 ID:** {place['id']}")
+
+    map_link = place.get('map_link')
+    if isinstance(map_link, str) and map_link.strip():
+        side.append(
+            f'<a href="{map_link}" target="_blank" style="text-decoration:none;">'
+            f'<button style="padding: 0.5em 1em;">🗺️ View on Map</button></a>'
+        )
+    return header, "\n\n".join(details), "\n\n".join(side)
+
 def display_place_card(place, card_id):
+    header, details, side = card_markdown(tuple(place.get(f) for f in CARD_FIELDS))
     with st.container():
-        st.markdown(f"### 📍 {place['place_name']}")
-        icon = CATEGORY_ICONS.get(place['category'], '🏷️')
-        st.markdown(f"**{icon} {place['category']}** • **{place['subcategory']}**")
-
+        st.markdown(header)
         col1, col2 = st.columns([2, 1])
         with col1:
-            if str(place.get('description', '')).strip():
-                st.markdown(f"**📖 Description:** {place['description']}")
-            if str(place.get('location', '')).strip():
-                st.markdown(f"**🌐 Location:** {place['location']}")
-            if str(place.get('best_time_to_visit', '')).strip():
-                st.markdown(f"**📅 Best time to visit:** {place['best_time_to_visit']}")
-            if str(place.get('facts', '')).strip():
-                st.markdown(f"**🧠 Interesting Fact:** {place['facts']}")
-            if str(place.get('rules', '')).strip():
-                st.markdown(f"**⚠️ Rules:** {place['rules']}")
+            if details:
+                st.markdown(details)
         with col2:
-            spooky_status = "Yes 👻" if bool(place['spooky']) else "No 😊"
-            st.markdown(f"**👻 Spooky?** {spooky_status}")
-            dist_val = place.get('distance_from_pune_km')
-            if pd.notna(dist_val):
-                st.markdown(f"**📏 Distance:** {float(dist_val):.1f} km")
-            else:
-                st.markdown(f"**📏 Distance:** —")
-            st.markdown(f"**🆔 ID:** {place['id']}")
-
-            map_link = place.get('map_link')
-            if isinstance(map_link, str) and map_link.strip():
-                st.markdown(
-                    f'<a href="{map_link}" target="_blank" style="text-decoration:none;">'
-                    f'<button style="padding: 0.5em 1em;">🗺️ View on Map</button></a>',
-                    unsafe_allow_html=True
-                )
+            st.markdown(side, unsafe_allow_html=True)
         st.markdown("---")
 
+def show_more_results(page_size):
+    st.session_state['visible_results'] += page_size
+
+def display_results(filtered_df, view_mode, page_size, filter_key):
+    """Render filtered places as paged cards or as one compact table"""
+    if view_mode == "Table":
+        st.dataframe(
+            filtered_df[TABLE_COLUMNS],
+            hide_index=True,
+            column_config={
+                'place_name': 'Place',
+                'category': 'Category',
+                'subcategory': 'Type',
+                'distance_from_pune_km': st.column_config.NumberColumn('Distance (km)', format="%.1f"),
+                'spooky': 'Spooky?',
+                'best_time_to_visit': 'Best time',
+                'location': 'Location',
+                'map_link': st.column_config.LinkColumn('Map', display_text="🗺️ Open"),
+            }
+        )
+        return
+
+    # Start again from the first page whenever the filters change
+    if st.session_state.get('results_filter_key') != filter_key:
+        st.session_state['results_filter_key'] = filter_key
+        st.session_state['visible_results'] = page_size
+    visible = st.session_state['visible_results']
+
+    for idx, place in filtered_df.head(visible).iterrows():
+        display_place_card(place, f"filtered_{idx}")
+
+    if visible < len(filtered_df):
+        st.caption(f"Showing {visible} of {len(filtered_df)} places")
+        st.button(
+            f"⬇️ Load {min(page_size, len(filtered_df) - visible)} more places",
+            key="load_more",
+            on_click=show_more_results,
+            args=(page_size,)
+        )
+
 # Main App
 def main():
     st.title("🗓️ Pune Weekend Diaries✨")
     st.markdown("### Hey Weekend Warrior! 🌍✨")
     st.markdown("Ready to discover amazing places around Pune for your next adventure?")
 
-    df = load_data()
+    data = load_data()
+    df = data.df
 
     # --- Sidebar ---
     # Image at top
-    img_base64 = img_to_base64("Img.jpg")
-    if img_base64:
+    img_html = sidebar_image_html("Img.jpg")
+    if img_html:
         st.sidebar.markdown(
             f"""
             <div style="text-align: center; margin-bottom: 20px;">
-                <img src="data:image/jpg;base64,{img_base64}" alt="Pune Hidden Gem" style="width: 100%; object-fit: cover; border-radius: 10px;">
+                {img_html}
             </div>
             """,
             unsafe_allow_html=True
@@ -188,100 +310,139 @@ def main():
 
     st.sidebar.markdown("## 🧭 Pick Your Vibe")
 
-    categories = sorted([c for c in df['category'].dropna().unique()])
+    categories, subcategories_by_category, max_dist_val = sidebar_options(data.version)
+    default_max = max_dist_val
+    # Widgets further down keep their values in session state, so the counts
+    # shown next to each option can follow every current filter
+    state = st.session_state
+    facets = facet_counts(
+        data.version,
+        tuple(sorted(state.get('selected_categories', []))),
+        tuple(sorted(state.get('selected_subcategories', []))) if state.get('selected_categories') else (),
+        float(state.get('max_distance', default_max if default_max > 0 else 100)),
+        SPOOKY_FILTERS[state.get('spooky_preference', "All places")],
+    )
     st.sidebar.markdown("### 🏷️ Main Categories")
     selected_categories = st.sidebar.multiselect(
         "Select destination categories:",
         categories,
+        format_func=lambda c: f"{c} ({facets['category'].get(c, 0)})",
+        key="selected_categories",
         help="Choose one or more main categories you're interested in!"
     )
 
     if selected_categories:
-        filtered_df_for_sub = df[df['category'].isin(selected_categories)]
-        subcategories = sorted([s for s in filtered_df_for_sub['subcategory'].dropna().unique()])
+        subcategories = sorted(set().union(*(subcategories_by_category.get(c, []) for c in selected_categories)))
         st.sidebar.markdown("### 🎪 Specific Types")
         selected_subcategories = st.sidebar.multiselect(
             "Select specific types (optional):",
             subcategories,
+            format_func=lambda s: f"{s} ({facets['subcategory'].get(s, 0)})",
+            key="selected_subcategories",
             help="Filter by specific types within selected categories"
         )
     else:
         selected_subcategories = []
 
-    # Distance slider guard
-    max_distance_available = df['distance_from_pune_km'].dropna()
-    if not max_distance_available.empty:
-        max_dist_val = int(max_distance_available.max())
-        default_max = max_dist_val
-    else:
-        max_dist_val = 100
-        default_max = 100
-
     st.sidebar.markdown("## 📏 Distance from Pune")
     max_distance = st.sidebar.slider(
         "Maximum distance (km):",
         min_value=0,
         max_value=max_dist_val if max_dist_val > 0 else 100,
         value=default_max if default_max > 0 else 100,
-        step=5
+        step=5,
+        key="max_distance"
     )
 
+    spooky_counts = facets['spooky']
+    spooky_labels = {
+        "All places": spooky_counts['true'] + spooky_counts['false'],
+        "Only spooky places": spooky_counts['true'],
+        "Only non-spooky places": spooky_counts['false'],
+    }
     spooky_preference = st.sidebar.selectbox(
         "👻 Spooky preference:",
-        ["All places", "Only spooky places", "Only non-spooky places"]
+        ["All places", "Only spooky places", "Only non-spooky places"],
+        format_func=lambda option: f"{option} ({spooky_labels[option]})",
+        key="spooky_preference"
     )
 
+    st.sidebar.markdown("## 🖼️ Display")
+    view_mode = st.sidebar.radio(
+        "Show results as:",
+        ["Cards", "Table"],
+        horizontal=True,
+        help="Table mode lists every match in one compact, sortable table"
+    )
+    page_size = st.sidebar.select_slider(
+        "Cards per page:",
+        options=PAGE_SIZE_OPTIONS,
+        value=10,
+        disabled=view_mode == "Table"
+    )
+
+    # --- Search ---
+    search_query = st.text_input(
+        "🔎 Search places",
+        placeholder="Try 'haunted fort', 'waterfall' or 'sinhagad'...",
+        help="Searches names, descriptions, facts, rules and locations"
+    )
+    if search_query.strip():
+        positions, _ = data.search_index.search(search_query, limit=10)
+        if len(positions) > 0:
+            st.markdown(f"## 🔎 Top {len(positions)} matches for \"{search_query.strip()}\"")
+            for pos in positions:
+                display_place_card(df.iloc[pos], f"search_{pos}")
+        else:
+            st.warning("🤔 No places match your search. Try another word!")
+
     # --- Main Filtering Logic ---
     if selected_categories:
-        filtered_df = df[df['category'].isin(selected_categories)]
-        if selected_subcategories:
-            filtered_df = filtered_df[filtered_df['subcategory'].isin(selected_subcategories)]
-        # Distance filter (NaN-safe by filling NaN with inf so they get excluded)
-        filtered_df = filtered_df[filtered_df['distance_from_pune_km'].fillna(float('inf')) <= float(max_distance)]
-
-        if spooky_preference == "Only spooky places":
-            filtered_df = filtered_df[filtered_df['spooky'] == True]
-        elif spooky_preference == "Only non-spooky places":
-            filtered_df = filtered_df[filtered_df['spooky'] == False]
-
-        if len(filtered_df) > 0:
-            st.markdown(f"## 🎉 Found {len(filtered_df)} amazing places for you!")
+        summary = filter_summary(
+            data.version,
+            tuple(sorted(selected_categories)),
+            tuple(sorted(selected_subcategories)),
+            float(max_distance),
+            SPOOKY_FILTERS[spooky_preference],
+        )
+        filtered_df = summary['df']
+
+        if summary['count'] > 0:
+            st.markdown(f"## 🎉 Found {summary['count']} amazing places for you!")
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Total Places", len(filtered_df))
+                st.metric("Total Places", summary['count'])
             with col2:
-                spooky_count = int(filtered_df['spooky'].sum())
-                st.metric("Spooky Places", spooky_count)
+                st.metric("Spooky Places", summary['spooky_count'])
             with col3:
-                if filtered_df['distance_from_pune_km'].notna().any():
-                    avg_distance = filtered_df['distance_from_pune_km'].mean()
-                    st.metric("Avg Distance", f"{avg_distance:.1f} km")
+                if summary['avg_distance'] is not None:
+                    st.metric("Avg Distance", f"{summary['avg_distance']:.1f} km")
                 else:
                     st.metric("Avg Distance", "—")
             with col4:
-                if filtered_df['distance_from_pune_km'].notna().any():
-                    max_dist = filtered_df['distance_from_pune_km'].max()
-                    st.metric("Max Distance", f"{max_dist:.1f} km")
+                if summary['max_distance'] is not None:
+                    st.metric("Max Distance", f"{summary['max_distance']:.1f} km")
                 else:
                     st.metric("Max Distance", "—")
 
             st.markdown("## 📊 Category Breakdown")
-            category_counts = filtered_df['category'].value_counts()
             col1, col2 = st.columns(2)
             with col1:
                 st.markdown("**Main Categories:**")
-                for category, count in category_counts.items():
+                for category, count in summary['category_counts']:
                     icon = CATEGORY_ICONS.get(category, '🏷️')
                     st.markdown(f"• {icon} {category}: {count} places")
             with col2:
                 st.markdown("**Top Subcategories:**")
-                subcategory_counts = filtered_df['subcategory'].value_counts().head(10)
-                for subcategory, count in subcategory_counts.items():
+                for subcategory, count in summary['top_subcategories']:
                     st.markdown(f"• {subcategory}: {count} places")
 
             st.markdown("---")
-            for idx, place in filtered_df.iterrows():
-                display_place_card(place, f"filtered_{idx}")
+            filter_key = (
+                tuple(selected_categories), tuple(selected_subcategories),
+                max_distance, spooky_preference, page_size
+            )
+            display_results(filtered_df, view_mode, page_size, filter_key)
 
         else:
             st.warning("🤔 No places found with your current filters. Try adjusting your preferences in the sidebar!")
@@ -291,18 +452,53 @@ def main():
     # --- Weekend Picks ---
     st.markdown("## 🗓️ This Weekend's Picks")
     with st.container():
-        st.info("🎯 **Curated Just For You** - Here are perfect destinations for your weekend adventure!")
-    weekend_picks = get_weekend_picks(df)
-    for idx, place in weekend_picks.iterrows():
-        display_place_card(place, f"weekend_{idx}")
+        st.info("🎯 **Curated Just For You** - A round trip from Pune that fits your day, in time-of-day order!")
+    col1, col2 = st.columns(2)
+    with col1:
+        plan_hours = st.slider("Hours you have:", min_value=2, max_value=16, value=8, key="plan_hours")
+    with col2:
+        plan_stops = st.slider("Most stops:", min_value=1, max_value=MAX_STOPS, value=4, key="plan_stops")
+    plan = plan_weekend(
+        data.version,
+        tuple(sorted(selected_categories)),
+        SPOOKY_FILTERS[spooky_preference],
+        float(plan_hours),
+        plan_stops,
+    )
+    if plan['stops']:
+        estimate = " (estimated)" if plan['estimated'] else ""
+        st.markdown(
+            f"**{len(plan['stops'])} stops · {plan['total_km']:.0f} km{estimate} · "
+            f"about {plan['total_hours']:.1f} hours including visits**"
+        )
+        current_slot = None
+        for pos, label, leg in zip(plan['stops'], plan['labels'], plan['legs']):
+            if label != current_slot:
+                st.markdown(f"### {label}")
+                current_slot = label
+            st.caption(f"🚗 {leg:.0f} km from the previous stop")
+            display_place_card(df.iloc[pos], f"weekend_{pos}")
+        st.caption(f"🏠 {plan['return_km']:.0f} km back to the start")
+    else:
+        weekend_picks = get_weekend_picks(data)
+        for idx, place in weekend_picks.iterrows():
+            display_place_card(place, f"weekend_{idx}")
 
     # --- Surprise Me Button ---
     st.markdown("## 🎁 Feeling Lucky?")
     st.markdown("Click below and discover a hidden gem you didn’t expect!")
     if st.button("🎉 Surprise Me!"):
         if len(df) > 0:
-            surprise = df.sample(1, random_state=random.randint(0, 10_000)).iloc[0]
-            display_place_card(surprise, "surprise_card")
+            # Each session walks its own shuffle, so no place repeats until all were shown
+            if 'surprise_seed' not in st.session_state:
+                st.session_state['surprise_seed'] = random.randrange(2 ** 32)
+                st.session_state['surprise_cursor'] = 0
+            surprise = data.random_places(
+                seed=st.session_state['surprise_seed'],
+                cursor=st.session_state['surprise_cursor']
+            )
+            st.session_state['surprise_cursor'] = surprise['next_cursor']
+            display_place_card(surprise['places'][0], "surprise_card")
         else:
             st.warning("No data available to surprise! Please check your CSV.")
 
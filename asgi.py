@@ -0,0 +1,313 @@
+"""ASGI entry point for the places API.
+
+``app`` serves the routes of ``flask_api`` unchanged (same paths, same JSON)
+under any ASGI server, e.g. ``uvicorn asgi:app``. The event loop only moves
+bytes: every Flask request runs on a bounded thread pool, and requests that
+walk the whole catalogue (exports, unpaginated ``/api/places``) get a pool of
+their own so they cannot hold up the cheap, mostly cached routes. Hashed
+image files from ``static/`` are kept in memory and answered straight from
+the loop.
+
+For production, start it with the bundled prefork runner, which loads the
+dataset once and then forks the workers so they share its pages:
+
+    python asgi.py --workers 4 --port 8000
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import signal
+import socket
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import uvicorn
+except ImportError:  # optional: only needed for the bundled runner
+    uvicorn = None
+
+import flask_api
+from assets import MANIFEST, STATIC_DIR, build_assets, is_hashed
+
+# Threads for ordinary requests, and for full-catalogue requests
+DEFAULT_THREADS = 8
+DEFAULT_HEAVY_THREADS = 2
+
+# Largest request body accepted (batch lookups are the only POST)
+MAX_BODY_BYTES = 1 << 20
+
+STATIC_CACHE_CONTROL = f'public, max-age={flask_api.STATIC_MAX_AGE}, immutable'
+
+_STATIC_TYPES = {'.webp': 'image/webp', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png'}
+
+
+def is_heavy(method, path, query_string):
+    """True for requests that serialize or scan the whole catalogue"""
+    if path == '/api/places/export':
+        return True
+    return method == 'GET' and path == '/api/places' and b'limit=' not in query_string
+
+
+def load_static(static_dir=STATIC_DIR):
+    """Bytes of every hashed asset listed in the manifest, keyed by URL path"""
+    try:
+        with open(os.path.join(static_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    files = {}
+    for entry in manifest.values():
+        for name in entry['files'].values():
+            if not is_hashed(name):
+                continue
+            try:
+                with open(os.path.join(static_dir, name), 'rb') as f:
+                    files[f'/static/{name}'] = f.read()
+            except OSError:
+                continue
+    return files
+
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope (PEP 3333)"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name in ('CONTENT_LENGTH', 'TRANSFER_ENCODING'):
+            # Replaced below: the body is already buffered in full
+            continue
+        else:
+            key = 'HTTP_' + name
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    # Chunked requests arrive without a length; WSGI apps need one to read the body
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+class WSGIBridge:
+    """Run a WSGI app behind ASGI on bounded thread pools"""
+
+    def __init__(self, wsgi_app, threads=DEFAULT_THREADS, heavy_threads=DEFAULT_HEAVY_THREADS):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self.heavy_threads = heavy_threads
+        self.static = {}
+        self._pools = None
+
+    def _start(self):
+        # Pools are created per process, after any fork
+        self._pools = (
+            (ThreadPoolExecutor(self.threads, thread_name_prefix='places'), asyncio.Semaphore(self.threads)),
+            (ThreadPoolExecutor(self.heavy_threads, thread_name_prefix='places-heavy'),
+             asyncio.Semaphore(self.heavy_threads)),
+        )
+        flask_api.store.current()
+        build_assets('Img.jpg')
+        self.static = load_static()
+
+    def _stop(self):
+        if self._pools:
+            for pool, _ in self._pools:
+                pool.shutdown(wait=False, cancel_futures=True)
+            self._pools = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            if self._pools is None:
+                self._start()
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await asyncio.get_running_loop().run_in_executor(None, self._start)
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self._stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        static = self.static.get(scope['path']) if scope['method'] in ('GET', 'HEAD') else None
+        if static is not None:
+            content_type = _STATIC_TYPES.get(os.path.splitext(scope['path'])[1], 'application/octet-stream')
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', content_type.encode()),
+                (b'content-length', str(len(static)).encode()),
+                (b'cache-control', STATIC_CACHE_CONTROL.encode()),
+            ]})
+            await send({'type': 'http.response.body', 'body': static if scope['method'] == 'GET' else b''})
+            return
+
+        chunks = []
+        size = 0
+        more = True
+        while more:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                await send({'type': 'http.response.start', 'status': 413,
+                            'headers': [(b'content-type', b'application/json')]})
+                await send({'type': 'http.response.body',
+                            'body': b'{"error":"Request body too large","success":false}\n'})
+                return
+            chunks.append(chunk)
+            more = message.get('more_body', False)
+        environ = build_environ(scope, b''.join(chunks))
+
+        heavy = is_heavy(scope['method'], scope['path'], scope.get('query_string', b''))
+        pool, slots = self._pools[1 if heavy else 0]
+        loop = asyncio.get_running_loop()
+        async with slots:
+            await self._run(loop, pool, environ, send)
+
+    async def _run(self, loop, pool, environ, send):
+        started = {}
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+            return written.append
+
+        def call():
+            result = self.wsgi_app(environ, start_response)
+            iterator = iter(result)
+            # Pull the first chunk here, so most responses need a single hop
+            return result, iterator, next(iterator, None)
+
+        def pull(iterator):
+            return next(iterator, None)
+
+        result, iterator, chunk = await loop.run_in_executor(pool, call)
+        try:
+            await send({'type': 'http.response.start', 'status': started['status'],
+                        'headers': started['headers']})
+            if written:
+                await send({'type': 'http.response.body', 'body': b''.join(written), 'more_body': True})
+            while chunk is not None:
+                following = await loop.run_in_executor(pool, pull, iterator)
+                await send({'type': 'http.response.body', 'body': chunk,
+                            'more_body': following is not None})
+                chunk = following
+                if chunk is None:
+                    return
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(pool, result.close)
+
+
+app = WSGIBridge(flask_api.app)
+
+
+def listen(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve(sock, log_level):
+    config = uvicorn.Config(app, lifespan='on', log_level=log_level, access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the places API over ASGI with uvicorn.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='processes to fork')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help='request threads per worker')
+    parser.add_argument('--heavy-threads', type=int, default=DEFAULT_HEAVY_THREADS,
+                        help='threads per worker for exports and full listings')
+    parser.add_argument('--no-preload', dest='preload', action='store_false',
+                        help='load the dataset in each worker instead of once before forking')
+    parser.add_argument('--log-level', default='info')
+    args = parser.parse_args()
+    if uvicorn is None:
+        parser.error('uvicorn is not installed (pip install uvicorn)')
+
+    app.threads = args.threads
+    app.heavy_threads = args.heavy_threads
+    if args.preload:
+        # Parsed frames, indexes and assets are inherited copy-on-write
+        flask_api.store.current()
+        build_assets('Img.jpg')
+        print(f'Preloaded {len(flask_api.store.current()):,} places from {flask_api.store.path}')
+
+    sock = listen(args.host, args.port)
+    print(f'Serving on http://{args.host}:{args.port} with {args.workers} worker(s)')
+    workers = args.workers if hasattr(os, 'fork') else 1
+    if workers <= 1:
+        serve(sock, args.log_level)
+        return
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            serve(sock, args.log_level)
+            os._exit(0)
+        children.append(pid)
+    sock.close()
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for pid in children:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                break
+
+
+if __name__ == '__main__':
+    main()
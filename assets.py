@@ -0,0 +1,139 @@
+"""Pre-built image assets for the Streamlit app and the API.
+
+The sidebar image is recompressed once into two variants (a WebP and a
+JPEG fallback for browsers without WebP) written to
+``static/`` under content-hashed names such as ``sidebar.3f9c1a2b.webp``.
+Because a name changes whenever its bytes do, clients can cache the files
+indefinitely and pages only ever carry short URLs, never the image itself.
+
+A ``manifest.json`` next to the variants maps each variant to its file and
+records the source's mtime/size, so variants are rebuilt only when the
+source image changes. Build them ahead of time with
+
+    python assets.py Img.jpg
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+
+try:
+    from PIL import Image
+except ImportError:  # optional: the source image is published as-is instead
+    Image = None
+
+STATIC_DIR = 'static'
+MANIFEST = 'manifest.json'
+
+# name -> (width in px, or None to keep the source width; format; quality)
+VARIANTS = {
+    'webp': (None, 'WEBP', 80),
+    'jpeg': (None, 'JPEG', 82),
+}
+
+_EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def _source_signature(path):
+    st = os.stat(path)
+    return {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+
+
+def _encode(image, width, fmt, quality):
+    if width and image.width > width:
+        height = round(image.height * width / image.width)
+        image = image.resize((width, height), Image.LANCZOS)
+    buf = io.BytesIO()
+    image.save(buf, fmt, quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+def _publish(data, stem, ext, out_dir):
+    """Write ``data`` under a content-hashed name and return that name"""
+    digest = hashlib.blake2b(data, digest_size=4).hexdigest()
+    name = f'{stem}.{digest}.{ext}'
+    path = os.path.join(out_dir, name)
+    if not os.path.exists(path):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return name
+
+
+def build_assets(source, stem='sidebar', out_dir=STATIC_DIR):
+    """Variant name -> hashed file name in ``out_dir``, or None if ``source`` is missing
+
+    Variants are reused as long as the manifest says they were built from
+    the current version of ``source`` into the current set of variants.
+    """
+    try:
+        signature = _source_signature(source)
+    except OSError:
+        return None
+
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    entry = manifest.get(stem)
+    expected = set(VARIANTS) if Image is not None else {'original'}
+    if (entry and entry.get('source') == signature and set(entry['files']) == expected
+            and all(os.path.exists(os.path.join(out_dir, name)) for name in entry['files'].values())):
+        return entry['files']
+
+    os.makedirs(out_dir, exist_ok=True)
+    files = {}
+    if Image is None:
+        with open(source, 'rb') as f:
+            data = f.read()
+        ext = os.path.splitext(source)[1].lstrip('.').lower() or 'bin'
+        files['original'] = _publish(data, stem, ext, out_dir)
+    else:
+        with Image.open(source) as image:
+            image = image.convert('RGB')
+            for variant, (width, fmt, quality) in VARIANTS.items():
+                data = _encode(image, width, fmt, quality)
+                files[variant] = _publish(data, f'{stem}-{variant}', _EXTENSIONS[fmt], out_dir)
+
+    # Drop files from the previous build of this stem
+    if entry:
+        for name in set(entry['files'].values()) - set(files.values()):
+            try:
+                os.remove(os.path.join(out_dir, name))
+            except OSError:
+                pass
+
+    manifest[stem] = {'source': signature, 'files': files}
+    tmp = manifest_path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, manifest_path)
+    return files
+
+
+def is_hashed(filename):
+    """True for names produced by ``build_assets``, which never change content"""
+    parts = os.path.basename(filename).split('.')
+    return len(parts) == 3 and len(parts[1]) == 8 and all(c in '0123456789abcdef' for c in parts[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build resized, content-hashed image variants.')
+    parser.add_argument('image', nargs='?', default='Img.jpg')
+    parser.add_argument('--stem', default='sidebar')
+    parser.add_argument('--out-dir', default=STATIC_DIR)
+    args = parser.parse_args()
+    files = build_assets(args.image, args.stem, args.out_dir)
+    if files is None:
+        parser.error(f'{args.image} not found')
+    for variant, name in files.items():
+        path = os.path.join(args.out_dir, name)
+        print(f'{variant}: {path} ({os.path.getsize(path):,} bytes)')
+
+
+if __name__ == '__main__':
+    main()
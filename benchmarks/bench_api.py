@@ -0,0 +1,254 @@
+"""Throughput and latency benchmark for every endpoint listed by the API.
+
+Each endpoint from ``GET /`` is driven two ways for every catalogue size:
+
+* ``client`` - in-process through Flask's test client (no network, shows
+  the cost of the route itself)
+* ``server`` - over HTTP against a threaded WSGI server in a subprocess,
+  from ``--concurrency`` client threads
+
+Synthetic catalogues are generated from the places.csv schema. Results are
+written as JSON so runs from different commits can be compared:
+
+    python -m benchmarks.bench_api --sizes 100,10000 --output before.json
+    python -m benchmarks.bench_api --sizes 100,10000 --compare before.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.synthetic import write_synthetic_csv
+from places_store import PlacesStore
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Default p50 latency ratio beyond which --compare reports a regression
+REGRESSION_THRESHOLD = 1.25
+
+
+def endpoint_paths(client):
+    """Concrete request paths for every endpoint advertised by ``GET /``"""
+    endpoints = client.get('/').get_json()['endpoints']
+    first = client.get('/api/places?limit=1&fields=id').get_json()
+    place_id = first['places'][0]['id']
+    cursor = first.get('next_cursor') or ''
+
+    paths = ['/']
+    for spec in endpoints:
+        method, path = spec.split(' ', 1)
+        if method != 'GET':
+            continue
+        path = path.replace('<id>', str(place_id)).replace('<next_cursor>', cursor)
+        paths.append(path)
+    return paths
+
+
+def summarize(latencies, elapsed, errors):
+    lat_ms = np.asarray(latencies) * 1e3
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'req_per_s': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(float(np.percentile(lat_ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(lat_ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(lat_ms, 99)), 3),
+    }
+
+
+def bench_client(client, path, requests):
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        latencies.append(time.perf_counter() - t0)
+        errors += response.status_code >= 500
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def bench_server(port, path, requests, concurrency):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    per_thread = max(1, requests // concurrency)
+
+    def worker():
+        local = []
+        failed = 0
+        for _ in range(per_thread):
+            t0 = time.perf_counter()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                failed += response.status >= 500
+            except OSError:
+                failed += 1
+            finally:
+                conn.close()
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(latencies, time.perf_counter() - start, errors[0])
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(csv_path, port):
+    """Run flask_api under a threaded WSGI server in a subprocess"""
+    env = dict(os.environ, PLACES_DATA_FILE=csv_path)
+    code = (
+        'from werkzeug.serving import run_simple\n'
+        'import flask_api\n'
+        'flask_api.store.current()\n'
+        f'run_simple("127.0.0.1", {port}, flask_api.app, threaded=True)\n'
+    )
+    proc = subprocess.Popen(
+        [sys.executable, '-c', code], cwd=REPO_ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 600
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError('API server exited during startup')
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError('API server did not start')
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold=REGRESSION_THRESHOLD):
+    """Print latency ratios against a previous run; returns regression count"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old = {(r['mode'], r['rows'], r['path']): r for r in baseline['results']}
+    regressions = 0
+    print(f"\nvs {baseline_path} (commit {baseline.get('commit')})")
+    for r in results:
+        before = old.get((r['mode'], r['rows'], r['path']))
+        if not before:
+            continue
+        ratio = r['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf')
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{r['mode']:<7} {r['rows']:>8} {r['path'][:60]:<60} "
+              f"p50 {before['p50_ms']:>9.3f} -> {r['p50_ms']:>9.3f} ms ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000,10000,100000,1000000',
+                        help='comma-separated synthetic catalogue sizes')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint and mode')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads in server mode')
+    parser.add_argument('--modes', default='client,server')
+    parser.add_argument('--endpoints', default=None, help='only paths matching this regex')
+    parser.add_argument('--output', default=None, help='write results as JSON here')
+    parser.add_argument('--compare', default=None, help='JSON results of an earlier run')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='p50 slowdown ratio reported as a regression')
+    args = parser.parse_args()
+
+    modes = args.modes.split(',')
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in [int(s) for s in args.sizes.split(',')]:
+            csv_path = write_synthetic_csv(os.path.join(tmp, f'places_{n}.csv'), n)
+            os.environ['PLACES_DATA_FILE'] = csv_path
+            # Point the module-level store at this catalogue (places_store
+            # reads PLACES_DATA_FILE only on its first import)
+            import flask_api
+            flask_api.store = PlacesStore(csv_path)
+
+            client = flask_api.app.test_client()
+            start = time.perf_counter()
+            flask_api.store.current()
+            load_s = time.perf_counter() - start
+            paths = [p for p in endpoint_paths(client)
+                     if not args.endpoints or re.search(args.endpoints, p)]
+            print(f"\n== {n:,} rows (cold load {load_s:.2f}s) ==")
+            print(f"{'mode':<7} {'path':<62} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+
+            server = None
+            port = None
+            if 'server' in modes:
+                port = free_port()
+                server = start_server(csv_path, port)
+            try:
+                for mode in modes:
+                    for path in paths:
+                        if mode == 'client':
+                            stats = bench_client(client, path, args.requests)
+                        else:
+                            stats = bench_server(port, path, args.requests, args.concurrency)
+                        results.append(dict(stats, mode=mode, rows=n, path=path, load_s=round(load_s, 3)))
+                        print(f"{mode:<7} {path[:62]:<62} {stats['req_per_s']:>9} "
+                              f"{stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f}")
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.wait()
+
+    report = {
+        'commit': git_commit(),
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            sys.exit(f'{regressions} endpoint(s) regressed by more than {args.threshold:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
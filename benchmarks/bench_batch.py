@@ -0,0 +1,124 @@
+"""One POST /api/places/batch against N GET /api/places/<id> calls.
+
+For every catalogue size and batch size, the same random ids are fetched
+both ways, in-process through Flask's test client and over HTTP against a
+threaded WSGI server in a subprocess. Each sample is the time to get all N
+records, so the two patterns are directly comparable:
+
+    python -m benchmarks.bench_batch --sizes 1000,100000 --batch-sizes 20,50
+"""
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_api import free_port, start_server, summarize
+from benchmarks.synthetic import write_synthetic_csv
+from places_store import PlacesStore
+
+
+def fetch_singles(get, ids):
+    for place_id in ids:
+        status, _ = get('GET', f'/api/places/{place_id}', None)
+        if status != 200:
+            return False
+    return True
+
+
+def fetch_batch(get, ids):
+    status, body = get('POST', '/api/places/batch', json.dumps({'ids': ids}).encode())
+    return status == 200 and json.loads(body)['count'] == len(ids)
+
+
+def client_get(client):
+    def get(method, path, body):
+        response = client.open(path, method=method, data=body, content_type='application/json')
+        return response.status_code, response.get_data()
+    return get
+
+
+def server_get(port):
+    def get(method, path, body):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        try:
+            conn.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            return response.status, response.read()
+        finally:
+            conn.close()
+    return get
+
+
+def run(get, pattern, id_pool, batch_size, rounds, rng):
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        ids = [int(i) for i in rng.choice(id_pool, size=batch_size, replace=False)]
+        t0 = time.perf_counter()
+        errors += not pattern(get, ids)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,100000')
+    parser.add_argument('--batch-sizes', default='20,50')
+    parser.add_argument('--rounds', type=int, default=50, help='fetches per pattern, mode and batch size')
+    parser.add_argument('--modes', default='client,server')
+    parser.add_argument('--output', default=None, help='write results as JSON here')
+    args = parser.parse_args()
+
+    modes = args.modes.split(',')
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+    results = []
+    print(f"{'mode':<7} {'rows':>8} {'N':>4} {'pattern':<8} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in [int(s) for s in args.sizes.split(',')]:
+            csv_path = write_synthetic_csv(os.path.join(tmp, f'places_{n}.csv'), n)
+            id_pool = pd.read_csv(csv_path, usecols=['id'])['id'].to_numpy()
+
+            getters = {}
+            if 'client' in modes:
+                os.environ['PLACES_DATA_FILE'] = csv_path
+                # Point the module-level store at this catalogue
+                import flask_api
+                flask_api.store = PlacesStore(csv_path)
+                flask_api.store.current()
+                getters['client'] = (client_get(flask_api.app.test_client()), None)
+            if 'server' in modes:
+                port = free_port()
+                getters['server'] = (server_get(port), start_server(csv_path, port))
+
+            try:
+                for mode, (get, _) in getters.items():
+                    for batch_size in batch_sizes:
+                        row = {}
+                        for name, pattern in (('single', fetch_singles), ('batch', fetch_batch)):
+                            rng = np.random.default_rng(batch_size)
+                            row[name] = run(get, pattern, id_pool, batch_size, args.rounds, rng)
+                        speedup = row['single']['p50_ms'] / row['batch']['p50_ms']
+                        for name, stats in row.items():
+                            print(f"{mode:<7} {n:>8} {batch_size:>4} {name:<8} "
+                                  f"{stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['errors']:>7} "
+                                  f"{f'{speedup:.1f}x' if name == 'batch' else '':>8}")
+                            results.append(dict(stats, mode=mode, rows=n, batch_size=batch_size, pattern=name))
+            finally:
+                for _, proc in getters.values():
+                    if proc is not None:
+                        proc.terminate()
+                        proc.wait()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
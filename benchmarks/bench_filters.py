@@ -0,0 +1,72 @@
+"""Filter latency vs. row count: boolean-mask scans against PlacesIndex.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_filters --sizes 124,10000,100000,1000000
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import synthetic_places
+from places_index import PlacesIndex
+
+QUERIES = {
+    'category': dict(category='Temple'),
+    'distance<=20': dict(max_distance=20.0),
+    'spooky': dict(spooky=True),
+    'category+distance+spooky': dict(category='Fort Trek', max_distance=50.0, spooky=False),
+}
+
+
+def scan(df, category=None, max_distance=None, spooky=None):
+    if category:
+        df = df[df['category'] == category]
+    if max_distance:
+        df = df[df['distance_from_pune_km'] <= max_distance]
+    if spooky is not None:
+        df = df[df['spooky'] == spooky]
+    return df.index.to_numpy()
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='124,1000,10000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'query':<26} {'matches':>8} {'scan ms':>9} {'index ms':>9} {'speedup':>8}")
+    for n in [int(s) for s in args.sizes.split(',')]:
+        df = synthetic_places(n)
+        start = time.perf_counter()
+        index = PlacesIndex(df)
+        build = time.perf_counter() - start
+        for name, query in QUERIES.items():
+            expected = scan(df, **query)
+            got = index.select(
+                categories=query.get('category'),
+                max_distance=query.get('max_distance'),
+                spooky=query.get('spooky'),
+            )
+            assert (expected == got).all(), name
+            t_scan = best_of(lambda: scan(df, **query), args.repeat)
+            t_index = best_of(lambda: index.select(
+                categories=query.get('category'),
+                max_distance=query.get('max_distance'),
+                spooky=query.get('spooky'),
+            ), args.repeat)
+            print(f"{n:>9} {name:<26} {len(got):>8} {t_scan * 1e3:>9.3f} "
+                  f"{t_index * 1e3:>9.3f} {t_scan / t_index:>7.1f}x")
+        print(f"{n:>9} {'(index build)':<26} {'':>8} {'':>9} {build * 1e3:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Per-worker memory of the API's loaded places data.
+
+A synthetic catalogue is generated, then loaded by fresh processes the way a
+worker would: once from the CSV (which also writes the snapshot) and once
+from the snapshot. Each process reports its resident memory after importing
+the API and after loading, split into private pages (paid by every worker)
+and clean file-backed pages (the memory-mapped snapshot, shared by workers):
+
+    python -m benchmarks.bench_memory --rows 1000000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import write_synthetic_csv
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process; prints one JSON line
+PROBE = r'''
+import gc, json, sys, time
+
+def memory():
+    fields = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if parts[0] in ('Rss:', 'Private_Dirty:', 'Private_Clean:', 'Shared_Clean:', 'Shared_Dirty:'):
+                    fields[parts[0][:-1]] = int(parts[1]) / 1024
+    except OSError:
+        import resource
+        fields['Rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return fields
+
+import flask_api
+from places_store import PlacesStore
+before = memory()
+start = time.perf_counter()
+data = PlacesStore(sys.argv[1]).current()
+elapsed = time.perf_counter() - start
+gc.collect()
+print(json.dumps({'rows': len(data), 'load_s': elapsed, 'imports': before, 'loaded': memory()}))
+'''
+
+
+def probe(csv_path):
+    out = subprocess.check_output([sys.executable, '-c', PROBE, csv_path], cwd=REPO_ROOT, text=True)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--csv', default=None, help='use this CSV instead of a synthetic one')
+    parser.add_argument('--output', default=None, help='write results as JSON here')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = args.csv or write_synthetic_csv(os.path.join(tmp, 'places.csv'), args.rows)
+        results = {'cold (CSV)': probe(csv_path), 'warm (snapshot)': probe(csv_path)}
+
+    print(f"{'load':<16} {'rows':>9} {'seconds':>8} {'RSS MB':>8} {'data MB':>8} {'private':>8} {'mapped':>8}")
+    for name, r in results.items():
+        loaded, imports = r['loaded'], r['imports']
+        private = loaded.get('Private_Dirty', 0) - imports.get('Private_Dirty', 0)
+        mapped = loaded.get('Private_Clean', 0) + loaded.get('Shared_Clean', 0) \
+            - imports.get('Private_Clean', 0) - imports.get('Shared_Clean', 0)
+        print(f"{name:<16} {r['rows']:>9,} {r['load_s']:>8.1f} {loaded['Rss']:>8.0f} "
+              f"{loaded['Rss'] - imports['Rss']:>8.0f} {private:>8.0f} {mapped:>8.0f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""k-NN latency of GeoIndex against a brute-force haversine scan.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_nearby --sizes 1000,100000,1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from geo_index import GeoIndex, haversine_km
+
+# Roughly the area covered by places.csv, centred on Pune
+LAT_RANGE = (17.5, 19.5)
+LNG_RANGE = (73.0, 75.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'points':>9} {'build ms':>9} {'scan us':>9} {'index us':>9} {'speedup':>8}")
+    for n in [int(s) for s in args.sizes.split(',')]:
+        lats = rng.uniform(*LAT_RANGE, size=n)
+        lngs = rng.uniform(*LNG_RANGE, size=n)
+        start = time.perf_counter()
+        index = GeoIndex(lats, lngs)
+        build = time.perf_counter() - start
+
+        queries = np.column_stack([
+            rng.uniform(*LAT_RANGE, size=args.queries),
+            rng.uniform(*LNG_RANGE, size=args.queries),
+        ])
+        t_scan = t_index = 0.0
+        for lat, lng in queries:
+            start = time.perf_counter()
+            dist = haversine_km(lat, lng, lats, lngs)
+            expected = np.argsort(dist, kind='stable')[:args.k]
+            t_scan += time.perf_counter() - start
+
+            start = time.perf_counter()
+            got, got_dist = index.query(lat, lng, args.k)
+            t_index += time.perf_counter() - start
+            assert np.allclose(dist[expected], got_dist), (lat, lng)
+
+        t_scan /= args.queries
+        t_index /= args.queries
+        print(f"{n:>9} {build * 1e3:>9.1f} {t_scan * 1e6:>9.1f} "
+              f"{t_index * 1e6:>9.1f} {t_scan / t_index:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""Synthetic places catalogues generated from the places.csv schema.
+
+Rows are resampled from the real file so text lengths and category mixes stay
+realistic; ids are renumbered and distances, spooky flags and coordinates are
+randomized so the indexes see a realistic spread of values.
+"""
+import os
+
+import numpy as np
+
+from places_store import read_places
+
+# The hand-curated catalogue the synthetic rows are drawn from
+SOURCE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'places.csv')
+
+
+def synthetic_places(n, seed=0, source=SOURCE_FILE):
+    """Return a DataFrame of ``n`` synthetic places"""
+    base = read_places(source)
+    rng = np.random.default_rng(seed)
+    df = base.iloc[rng.integers(0, len(base), size=n)].reset_index(drop=True)
+    df['id'] = np.arange(1, n + 1)
+    df['distance_from_pune_km'] = np.round(rng.gamma(2.0, 30.0, size=n), 1)
+    df['spooky'] = rng.random(n) < 0.15
+    lats = np.round(rng.uniform(17.5, 19.5, size=n), 6)
+    lngs = np.round(rng.uniform(73.0, 75.0, size=n), 6)
+    df['coordinates'] = [[lat, lng] for lat, lng in zip(lats.tolist(), lngs.tolist())]
+    return df
+
+
+def write_synthetic_csv(path, n, seed=0, source=SOURCE_FILE):
+    """Write a synthetic catalogue of ``n`` rows to ``path``"""
+    synthetic_places(n, seed, source).to_csv(path, index=False)
+    return path
@@ -1,17 +1,70 @@
-from flask import Flask, jsonify, request
-import pandas as pd
-import ast
+from flask import Flask, Response, g, jsonify, request
+import cProfile
+import io
+import math
+import os
+import pstats
 import random
+import re
+import time
+import zlib
 from datetime import datetime
 
+from assets import build_assets, is_hashed
+from metrics import PHASE_SECONDS, registry
+from places_store import DATA_FILE, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, PlacesStore, decode_cursor
+from sampling import WEIGHTINGS
+from responses import ResponseCache, cached_response, encode, timestamped_response
+
 app = Flask(__name__)
 
-# Load data
-def load_data():
-    df = pd.read_csv('places.csv')
-    # Convert coordinates string to list
-    df['coordinates'] = df['coordinates'].apply(ast.literal_eval)
-    return df
+# Shared places data, parsed once and reloaded only when the file changes
+store = PlacesStore(DATA_FILE)
+
+# Most neighbours /api/places/nearby will return
+MAX_NEARBY = 100
+
+# Most results /api/search will return
+MAX_SEARCH_RESULTS = 50
+
+# Most ids one /api/places/batch request may ask for
+MAX_BATCH_IDS = 500
+
+# Most places one /api/places/random request may draw
+MAX_RANDOM_PLACES = 50
+
+# Budget /api/plan uses when neither hours nor km is given
+DEFAULT_PLAN_HOURS = 8.0
+
+# Encoded bodies of data-only responses, per dataset version and query
+response_cache = ResponseCache(maxsize=256)
+
+# Request metrics, exposed at /api/metrics
+REQUESTS = registry.counter(
+    'places_http_requests_total', 'Requests handled, by route, method and status',
+    labels=('route', 'method', 'status'))
+REQUEST_SECONDS = registry.histogram(
+    'places_http_request_duration_seconds', 'Request latency until the response is written, by route',
+    labels=('route',))
+ERRORS = registry.counter(
+    'places_errors_total', 'Unhandled errors turned into 500 responses, by route and exception',
+    labels=('route', 'exception'))
+registry.gauge_callback('places_response_cache_hits_total', 'Response cache hits',
+                        lambda: response_cache.hits, kind='counter')
+registry.gauge_callback('places_response_cache_misses_total', 'Response cache misses',
+                        lambda: response_cache.misses, kind='counter')
+registry.gauge_callback('places_data_reloads_total', 'Times the places file was (re)loaded',
+                        lambda: store.reloads, kind='counter')
+registry.gauge_callback('places_data_rows', 'Rows in the currently loaded places data',
+                        lambda: len(store.current()))
+
+# Opt-in per-request profiling: with PLACES_PROFILING=1, a request sent with
+# an "X-Profile: 1" header is run under cProfile and the stats are saved
+PROFILING_ENABLED = os.environ.get('PLACES_PROFILING') == '1'
+PROFILE_DIR = os.environ.get('PLACES_PROFILE_DIR', 'profiles')
+
+# Content-hashed files under static/ never change, so clients may keep them
+STATIC_MAX_AGE = 365 * 24 * 3600
 
 # Secret travel tips
 SECRET_TIPS = [
@@ -25,6 +78,57 @@ SECRET_TIPS = [
     "🔐 Ghumakkad's Secret Tip: Always greet the local deity before starting your journey—it's considered auspicious! 🙏🕉️"
 ]
 
+def route_label():
+    """Route pattern of the current request, to keep metric labels bounded"""
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def dump_profile(profiler, route):
+    """Save a request profile and log its top functions; returns the file path"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+    path = os.path.join(PROFILE_DIR, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{name}.prof")
+    profiler.dump_stats(path)
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(25)
+    app.logger.info('Profile for %s saved to %s\n%s', route, path, summary.getvalue())
+    return path
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if PROFILING_ENABLED and request.headers.get('X-Profile') == '1':
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def record_request_metrics(response):
+    handled = time.perf_counter()
+    start = g.get('request_start', handled)
+    route = route_label()
+    
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        response.headers['X-Profile-File'] = dump_profile(profiler, route)
+    
+    REQUESTS.inc(route, request.method, response.status_code)
+    
+    def finished():
+        done = time.perf_counter()
+        PHASE_SECONDS.observe(done - handled, 'write')
+        REQUEST_SECONDS.observe(done - start, route)
+    
+    # Runs once the server has written (or streamed) the whole body
+    response.call_on_close(finished)
+    return response
+
+@app.after_request
+def cache_static_assets(response):
+    filename = (request.view_args or {}).get('filename', '')
+    if request.endpoint == 'static' and response.status_code == 200 and is_hashed(filename):
+        response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+    return response
+
 @app.route('/')
 def home():
     """Home page with API information"""
@@ -35,41 +139,147 @@ def home():
         'endpoints': {
             'GET /api/places': 'Get all places',
             'GET /api/places?category=Nature&max_distance=50&spooky=false': 'Get filtered places with query parameters',
+            'GET /api/places?limit=20&cursor=<next_cursor>&fields=id,place_name': 'Get a page of places with selected fields',
+            'GET /api/places/export?format=ndjson&gzip=true': 'Stream all (filtered) places as NDJSON',
+            'GET /api/places/nearby?lat=18.52&lng=73.86&radius_km=25&k=10': 'Get the places nearest to a point',
             'GET /api/places/random': 'Get a random place',
+            'GET /api/places/random?n=3&weight=nearby&seed=42&cursor=0&category=Nature': 'Get random places, optionally weighted (uniform, nearby, category) and filtered; with a seed, pass back next_cursor to avoid repeats',
+            'GET /api/search?q=haunted%20fort': 'Search places by name, description, facts, rules and location',
             'GET /api/tips': 'Get a random secret travel tip',
             'GET /api/categories': 'Get all available categories',
             'GET /api/stats': 'Get statistics about the places',
-            'GET /api/places/<id>': 'Get a specific place by ID'
+            'GET /api/facets?category=Fort%20Trek&category=Cafe&max_distance=50&spooky=false': 'Get counts per category, subcategory, spooky flag, best time and distance bucket under the given filters',
+            'GET /api/metrics': 'Get request, cache and data-reload metrics (Prometheus text format)',
+            'GET /api/places/<id>': 'Get a specific place by ID',
+            'POST /api/places/batch': 'Get several places by ID: {"ids": [1, 2, 3], "fields": ["id", "place_name"]}',
+            'GET /api/plan?hours=8&category=Fort%20Trek&category=Cafe&spooky=false': 'Plan an ordered weekend itinerary within a time (hours) or distance (km) budget, optionally from lat/lng'
         },
         'timestamp': datetime.now().isoformat()
     })
 
+def filter_args():
+    """Read the category/subcategory/max_distance/spooky query parameters
+    
+    Raises ValueError for a max_distance that is not a finite number.
+    """
+    category = request.args.get('category') or None
+    subcategory = request.args.get('subcategory') or None
+    max_distance = request.args.get('max_distance', type=float) or None
+    spooky = request.args.get('spooky', type=str)
+    
+    if max_distance is not None and not math.isfinite(max_distance):
+        raise ValueError('max_distance must be a finite number')
+    
+    if spooky is not None:
+        spooky = {'true': True, 'false': False}.get(spooky.lower())
+    
+    return category, subcategory, max_distance, spooky
+
 @app.route('/api/places')
 def get_places():
     """Get all places with optional filtering"""
     try:
-        df = load_data()
+        data = store.current()
         
         # Get query parameters
-        category = request.args.get('category')
-        max_distance = request.args.get('max_distance', type=float)
-        spooky = request.args.get('spooky', type=str)
+        category, subcategory, max_distance, spooky = filter_args()
         
-        # Apply filters
-        if category:
-            df = df[df['category'] == category]
+        # Pagination and field projection (optional)
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor') or None
+        fields = request.args.get('fields') or None
+        paginate = limit is not None or cursor is not None
         
-        if max_distance:
-            df = df[df['distance_from_pune_km'] <= max_distance]
+        if fields is not None:
+            fields = tuple(f.strip() for f in fields.split(',') if f.strip())
+            unknown = [f for f in fields if f not in data.fields]
+            if unknown:
+                return bad_request(f"Unknown fields: {', '.join(unknown)}")
+        if paginate:
+            limit = min(max(DEFAULT_PAGE_SIZE if limit is None else limit, 1), MAX_PAGE_SIZE)
+            after = decode_cursor(cursor) if cursor else None
         
-        if spooky is not None:
-            if spooky.lower() == 'true':
-                df = df[df['spooky'] == True]
-            elif spooky.lower() == 'false':
-                df = df[df['spooky'] == False]
+        def build():
+            # Apply filters
+            positions = data.select(category, max_distance, spooky, subcategory)
+            if not paginate:
+                places = data.project(positions, fields)
+                return {
+                    'success': True,
+                    'count': len(places),
+                    'places': places
+                }
+            chunk, next_cursor = data.page(positions, limit, after)
+            places = data.project(chunk, fields)
+            return {
+                'success': True,
+                'count': len(places),
+                'places': places,
+                'has_more': next_cursor is not None,
+                'next_cursor': next_cursor
+            }
+        
+        key = ('places', category, subcategory, max_distance, spooky, limit, cursor, fields)
+        return cached_response(response_cache, data.version, key, build)
+    
+    except ValueError as e:
+        return bad_request(str(e))
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/api/places/export')
+def export_places():
+    """Stream every matching place as NDJSON, optionally gzipped"""
+    try:
+        data = store.current()
+        category, subcategory, max_distance, spooky = filter_args()
         
-        # Convert to JSON
-        places = df.to_dict('records')
+        export_format = request.args.get('format', 'ndjson')
+        if export_format != 'ndjson':
+            return bad_request(f'Unsupported export format: {export_format}')
+        compress = request.args.get('gzip', 'false').lower() in ('1', 'true', 'yes')
+        
+        positions = data.select(category, max_distance, spooky, subcategory)
+        chunks = data.iter_ndjson(positions)
+        
+        headers = {
+            'Content-Disposition': 'attachment; filename=places.ndjson',
+            'X-Dataset-Version': data.version
+        }
+        if compress:
+            chunks = gzip_stream(chunks)
+            headers['Content-Encoding'] = 'gzip'
+        
+        return Response(chunks, headers=headers, mimetype='application/x-ndjson')
+    
+    except ValueError as e:
+        return bad_request(str(e))
+    except Exception as e:
+        return server_error(e)
+
+def gzip_stream(chunks):
+    """Gzip a stream of byte chunks incrementally"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+@app.route('/api/places/nearby')
+def get_nearby_places():
+    """Get the places closest to a point"""
+    try:
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        radius_km = request.args.get('radius_km', type=float)
+        k = request.args.get('k', default=10, type=int)
+        
+        if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return bad_request('lat and lng are required and must be valid coordinates')
+        k = min(max(k, 1), MAX_NEARBY)
+        
+        places = store.current().nearby(lat, lng, k, radius_km)
         
         return jsonify({
             'success': True,
@@ -79,31 +289,113 @@ def get_places():
         })
     
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'timestamp': datetime.now().isoformat()
-        }), 500
+        return server_error(e)
 
 @app.route('/api/places/random')
 def get_random_place():
-    """Get a random place"""
+    """Get one or more random places, optionally weighted, filtered and seeded"""
     try:
-        df = load_data()
-        random_place = df.sample(n=1).iloc[0].to_dict()
+        data = store.current()
+        category, subcategory, max_distance, spooky = filter_args()
+        n = request.args.get('n', default=1, type=int)
+        weighting = request.args.get('weight', 'uniform')
+        seed = request.args.get('seed', type=int)
+        cursor = request.args.get('cursor', default=0, type=int)
         
-        return jsonify({
-            'success': True,
-            'place': random_place,
-            'timestamp': datetime.now().isoformat()
-        })
+        if weighting not in WEIGHTINGS:
+            return bad_request(f"Unknown weight: {weighting} (use one of {', '.join(WEIGHTINGS)})")
+        if (seed is not None and seed < 0) or cursor < 0:
+            return bad_request('seed and cursor must be non-negative integers')
+        n = min(max(n, 1), MAX_RANDOM_PLACES)
+        
+        def build():
+            result = data.random_places(n, weighting, seed, cursor,
+                                        category, max_distance, spooky, subcategory)
+            places = result['places']
+            return {
+                'success': True,
+                'place': places[0] if places else None,
+                'places': places,
+                'count': len(places),
+                'seed': seed,
+                'next_cursor': result['next_cursor']
+            }
+        
+        if seed is None:
+            return jsonify(dict(build(), timestamp=datetime.now().isoformat()))
+        # A seeded draw is reproducible, so it can be cached like any query
+        key = ('random', category, subcategory, max_distance, spooky, n, weighting, seed, cursor)
+        return cached_response(response_cache, data.version, key, build)
     
+    except ValueError as e:
+        return bad_request(str(e))
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'timestamp': datetime.now().isoformat()
-        }), 500
+        return server_error(e)
+
+@app.route('/api/search')
+def search_places():
+    """Full-text search over place names, descriptions, facts, rules and locations"""
+    try:
+        data = store.current()
+        
+        query = ' '.join(request.args.get('q', '').split()).lower()
+        limit = min(max(request.args.get('limit', default=10, type=int), 1), MAX_SEARCH_RESULTS)
+        prefix = request.args.get('prefix', 'true').lower() not in ('0', 'false', 'no')
+        
+        if not query:
+            return bad_request('Query parameter q is required')
+        
+        def build():
+            results = data.search(query, limit, prefix)
+            return {
+                'success': True,
+                'query': query,
+                'count': len(results),
+                'results': results
+            }
+        
+        key = ('search', query, limit, prefix)
+        return cached_response(response_cache, data.version, key, build)
+    
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/api/plan')
+def plan_weekend():
+    """Plan an ordered round trip through matching places within a budget"""
+    try:
+        data = store.current()
+        
+        categories = tuple(sorted(c for c in request.args.getlist('category') if c)) or None
+        _, _, _, spooky = filter_args()
+        hours = request.args.get('hours', type=float)
+        km = request.args.get('km', type=float)
+        max_stops = request.args.get('max_stops', default=6, type=int)
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        
+        if (lat is None) != (lng is None):
+            return bad_request('lat and lng must be given together')
+        if lat is not None and not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return bad_request('lat and lng must be valid coordinates')
+        if any(v is not None and not (math.isfinite(v) and v > 0) for v in (hours, km)):
+            return bad_request('hours and km must be positive finite numbers')
+        if hours is None and km is None:
+            hours = DEFAULT_PLAN_HOURS
+        start = (lat, lng) if lat is not None else None
+        
+        def build():
+            plan = data.plan(categories, spooky, start, hours, km, max_stops)
+            return dict(plan, success=True, count=len(plan['stops']),
+                        budget={'hours': hours, 'km': km})
+        
+        key = ('plan', categories, spooky, start, hours, km, max_stops)
+        return cached_response(response_cache, data.version, key, build)
+    
+    except ValueError as e:
+        return bad_request(str(e))
+    except Exception as e:
+        return server_error(e)
 
 @app.route('/api/tips')
 def get_random_tip():
@@ -118,91 +410,157 @@ def get_random_tip():
         })
     
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'timestamp': datetime.now().isoformat()
-        }), 500
+        return server_error(e)
 
 @app.route('/api/categories')
 def get_categories():
     """Get all available categories"""
     try:
-        df = load_data()
-        categories = sorted(df['category'].unique().tolist())
+        data = store.current()
         
-        return jsonify({
-            'success': True,
-            'categories': categories,
-            'count': len(categories),
-            'timestamp': datetime.now().isoformat()
-        })
+        def build():
+            categories = data.categories()
+            return {
+                'success': True,
+                'categories': categories,
+                'count': len(categories)
+            }
+        
+        return cached_response(response_cache, data.version, ('categories',), build)
     
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'timestamp': datetime.now().isoformat()
-        }), 500
+        return server_error(e)
+
+@app.route('/api/facets')
+def get_facets():
+    """Facet counts for a filter combination, for building filter UIs"""
+    try:
+        data = store.current()
+        
+        categories = tuple(sorted(c for c in request.args.getlist('category') if c)) or None
+        subcategories = tuple(sorted(s for s in request.args.getlist('subcategory') if s)) or None
+        _, _, max_distance, spooky = filter_args()
+        
+        def build():
+            facets = data.facets(categories, max_distance, spooky, subcategories)
+            total = facets.pop('total')
+            return {
+                'success': True,
+                'total': total,
+                'facets': facets,
+                'filters': {
+                    'category': list(categories or ()),
+                    'subcategory': list(subcategories or ()),
+                    'max_distance': max_distance,
+                    'spooky': spooky
+                }
+            }
+        
+        key = ('facets', categories, subcategories, max_distance, spooky)
+        return cached_response(response_cache, data.version, key, build)
+    
+    except ValueError as e:
+        return bad_request(str(e))
+    except Exception as e:
+        return server_error(e)
 
 @app.route('/api/stats')
 def get_stats():
     """Get statistics about the places"""
     try:
-        df = load_data()
-        
-        stats = {
-            'total_places': len(df),
-            'categories': df['category'].value_counts().to_dict(),
-            'spooky_places': int(df['spooky'].sum()),
-            'non_spooky_places': int((~df['spooky']).sum()),
-            'avg_distance': float(df['distance_from_pune_km'].mean()),
-            'max_distance': float(df['distance_from_pune_km'].max()),
-            'min_distance': float(df['distance_from_pune_km'].min()),
-            'best_times': df['best_time_to_visit'].value_counts().to_dict()
-        }
+        data = store.current()
         
-        return jsonify({
-            'success': True,
-            'stats': stats,
-            'timestamp': datetime.now().isoformat()
-        })
+        def build():
+            return {
+                'success': True,
+                'stats': data.stats()
+            }
+        
+        return cached_response(response_cache, data.version, ('stats',), build)
     
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'timestamp': datetime.now().isoformat()
-        }), 500
+        return server_error(e)
 
 @app.route('/api/places/<int:place_id>')
 def get_place_by_id(place_id):
     """Get a specific place by ID"""
     try:
-        df = load_data()
-        place = df[df['id'] == place_id]
+        place_json = store.current().place_json(place_id)
         
-        if place.empty:
+        if place_json is None:
             return jsonify({
                 'success': False,
                 'error': f'Place with ID {place_id} not found',
                 'timestamp': datetime.now().isoformat()
             }), 404
         
-        place_data = place.iloc[0].to_dict()
+        # The record is already encoded, so splice it into the envelope
+        body = b'{"place":' + place_json + b',"success":true}'
+        return timestamped_response(body)
+    
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/api/places/batch', methods=['POST'])
+def get_places_batch():
+    """Get several places by ID in one request, reporting the ids not found"""
+    try:
+        data = store.current()
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return bad_request('Expected a JSON object like {"ids": [1, 2, 3]}')
+        
+        ids = payload.get('ids')
+        if not isinstance(ids, list) or not all(type(i) is int for i in ids):
+            return bad_request('ids must be a list of integer place IDs')
+        if len(ids) > MAX_BATCH_IDS:
+            return bad_request(f'At most {MAX_BATCH_IDS} ids per request')
         
-        return jsonify({
-            'success': True,
-            'place': place_data,
-            'timestamp': datetime.now().isoformat()
-        })
+        fields = payload.get('fields')
+        if isinstance(fields, str):
+            fields = [f.strip() for f in fields.split(',') if f.strip()]
+        if fields is not None:
+            if not isinstance(fields, list) or not all(isinstance(f, str) for f in fields):
+                return bad_request('fields must be a list of field names')
+            unknown = [f for f in fields if f not in data.fields]
+            if unknown:
+                return bad_request(f"Unknown fields: {', '.join(unknown)}")
+        
+        positions, missing = data.lookup(ids)
+        
+        # Full records are already encoded, so splice them into the envelope
+        if fields is None:
+            places = b'[' + b','.join(data.record_json(pos) for pos in positions) + b']'
+        else:
+            places = encode(data.project(positions, fields))
+        body = (b'{"count":' + str(len(positions)).encode() + b',"missing":' + encode(missing)
+                + b',"places":' + places + b',"success":true}')
+        return timestamped_response(body)
     
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'timestamp': datetime.now().isoformat()
-        }), 500
+        return server_error(e)
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Prometheus-style metrics for this process"""
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def server_error(error):
+    """Log and count an unexpected failure, then answer with a 500"""
+    app.logger.exception('Unhandled error in %s %s', request.method, request.path)
+    ERRORS.inc(route_label(), type(error).__name__)
+    return jsonify({
+        'success': False,
+        'error': str(error),
+        'timestamp': datetime.now().isoformat()
+    }), 500
+
+def bad_request(message):
+    return jsonify({
+        'success': False,
+        'error': message,
+        'timestamp': datetime.now().isoformat()
+    }), 400
 
 @app.errorhandler(404)
 def not_found(error):
@@ -225,11 +583,24 @@ if __name__ == '__main__':
     print("📖 Available endpoints:")
     print("   - GET / (Home page)")
     print("   - GET /api/places (All places)")
+    print("   - GET /api/places/export (NDJSON export)")
+    print("   - GET /api/places/nearby (Places near a point)")
     print("   - GET /api/places/random (Random place)")
+    print("   - GET /api/search?q= (Full-text search)")
+    print("   - GET /api/plan (Weekend itinerary)")
     print("   - GET /api/tips (Random tip)")
     print("   - GET /api/categories (All categories)")
+    print("   - GET /api/facets (Filter option counts)")
     print("   - GET /api/stats (Statistics)")
+    print("   - GET /api/metrics (Prometheus metrics)")
     print("   - GET /api/places/<id> (Specific place)")
+    print("   - POST /api/places/batch (Several places by ID)")
+    print("   - GET /static/<file> (Image assets)")
     print("\n🚀 Server starting on http://localhost:5000")
+    print("   (development server; for production run: python asgi.py --workers 4)")
+    
+    # Parse the places file and build image variants before the first request comes in
+    store.current()
+    build_assets('Img.jpg')
     
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
@@ -0,0 +1,177 @@
+"""Nearest-neighbour search over place coordinates.
+
+Coordinates come from the ``@lat,lng`` / ``query=lat,lng`` / ``!3d..!4d..``
+parts of Google Maps links. ``GeoIndex`` buckets points into a uniform
+lat/lng grid (cells sized for a handful of points each) and answers k-NN
+queries by scanning rings of cells outward from the query point, computing
+haversine distances with NumPy only for the points in those cells.
+
+An index can also be updated from the previous version's: the grid is kept,
+unchanged points keep their cells and only fresh points are bucketed and
+merged in, until the point count drifts far enough from the one the grid was
+sized for that a rebuild is due.
+"""
+import math
+import re
+
+import numpy as np
+
+from places_delta import merge_sorted
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+
+_COORD_PATTERNS = [
+    re.compile(r'@(-?\d{1,2}(?:\.\d+)?),\s*(-?\d{1,3}(?:\.\d+)?)'),
+    re.compile(r'!3d(-?\d{1,2}(?:\.\d+)?)!4d(-?\d{1,3}(?:\.\d+)?)'),
+    re.compile(r'[?&](?:q|query|ll|destination)=(-?\d{1,2}(?:\.\d+)?)(?:,|%2C)\s*(-?\d{1,3}(?:\.\d+)?)'),
+]
+
+
+def parse_coordinates(map_link):
+    """Extract ``[lat, lng]`` from a maps URL, or None if it has none"""
+    if not isinstance(map_link, str):
+        return None
+    for pattern in _COORD_PATTERNS:
+        match = pattern.search(map_link)
+        if match:
+            lat, lng = float(match.group(1)), float(match.group(2))
+            if -90 <= lat <= 90 and -180 <= lng <= 180:
+                return [lat, lng]
+    return None
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distance from one point to arrays of points, in km"""
+    lat, lng = math.radians(lat), math.radians(lng)
+    lats, lngs = np.radians(lats), np.radians(lngs)
+    a = (np.sin((lats - lat) / 2) ** 2
+         + math.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+# Rebuild instead of updating once the point count is this far (either way)
+# from the count the grid was sized for
+REGRID_FACTOR = 2.0
+
+# Cell keys are ix * _ROW + iy, which sorts like (ix, iy) while |iy| < 2**31
+_ROW = 1 << 32
+
+
+class GeoIndex:
+    """Uniform-grid spatial index over row positions with coordinates
+
+    With ``previous`` (the index of the version before) and the
+    ``RowDelta`` between them, the grid and the unchanged points' cells are
+    taken from ``previous``.
+    """
+
+    def __init__(self, lats, lngs, points_per_cell=8, previous=None, delta=None):
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        valid = np.flatnonzero(~(np.isnan(lats) | np.isnan(lngs)))
+        self.size = len(valid)
+        self.cells = {}
+        if not self.size:
+            self.cell_deg = 1.0
+            return
+
+        if previous is not None and previous.size and (
+                previous.grid_size / REGRID_FACTOR <= self.size <= previous.grid_size * REGRID_FACTOR):
+            self.grid_size = previous.grid_size
+            self.cell_deg = previous.cell_deg
+            carried = delta.carry(previous.positions)
+            fresh = delta.fresh[~(np.isnan(lats[delta.fresh]) | np.isnan(lngs[delta.fresh]))]
+            # Carried points are still in cell order
+            keys, self.positions = merge_sorted(self._keys(lats[carried], lngs[carried]), carried,
+                                                self._keys(lats[fresh], lngs[fresh]), fresh)
+        else:
+            # Pick a cell size that puts ~points_per_cell points in each cell
+            span = max(np.ptp(lats[valid]), np.ptp(lngs[valid]), 1e-3)
+            cells_per_side = max(1, int(math.sqrt(self.size / points_per_cell)))
+            self.grid_size = self.size
+            self.cell_deg = span / cells_per_side
+
+            keys = self._keys(lats[valid], lngs[valid])
+            order = np.argsort(keys, kind='stable')
+            keys = keys[order]
+            self.positions = valid[order]
+        self.lats = lats[self.positions]
+        self.lngs = lngs[self.positions]
+
+        # Points are grouped by cell: cell key -> (start, end) slice of them
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        bounds = np.r_[starts, len(keys)].tolist()
+        self.cells = dict(zip(keys[starts].tolist(), zip(bounds[:-1], bounds[1:])))
+        ix = np.floor(self.lats / self.cell_deg).astype(np.int64)
+        iy = np.floor(self.lngs / self.cell_deg).astype(np.int64)
+        self.ix_range = (int(ix.min()), int(ix.max()))
+        self.iy_range = (int(iy.min()), int(iy.max()))
+
+    def _keys(self, lats, lngs):
+        """Cell key of each point, ordered like the (ix, iy) grid order"""
+        ix = np.floor(lats / self.cell_deg).astype(np.int64)
+        iy = np.floor(lngs / self.cell_deg).astype(np.int64)
+        return ix * _ROW + iy
+
+    def _ring(self, cx, cy, r):
+        """Candidate slices for the cells exactly ``r`` steps from (cx, cy)"""
+        cells = self.cells
+        if r == 0:
+            found = cells.get(cx * _ROW + cy)
+            return [found] if found else []
+        (x0, x1), (y0, y1) = self.ix_range, self.iy_range
+        keys = []
+        # Top and bottom edges of the ring, clipped to the occupied grid
+        for y in (cy - r, cy + r):
+            if y0 <= y <= y1:
+                keys.extend(x * _ROW + y for x in range(max(cx - r, x0), min(cx + r, x1) + 1))
+        # Left and right edges, without the corners
+        for x in (cx - r, cx + r):
+            if x0 <= x <= x1:
+                keys.extend(x * _ROW + y for y in range(max(cy - r + 1, y0), min(cy + r - 1, y1) + 1))
+        return [cells[key] for key in keys if key in cells]
+
+    def query(self, lat, lng, k=10, radius_km=None):
+        """Up to ``k`` nearest row positions and their distances in km
+
+        Only points within ``radius_km`` are returned when it is given.
+        """
+        if not self.size or k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        cx = int(math.floor(lat / self.cell_deg))
+        cy = int(math.floor(lng / self.cell_deg))
+        (x0, x1), (y0, y1) = self.ix_range, self.iy_range
+        # Rings closer than the occupied grid are empty, so start at its edge
+        min_r = max(x0 - cx, cx - x1, y0 - cy, cy - y1, 0)
+        max_r = max(abs(cx - x0), abs(cx - x1), abs(cy - y0), abs(cy - y1))
+
+        best_pos = np.empty(0, dtype=np.intp)
+        best_dist = np.empty(0)
+        for r in range(min_r, max_r + 1):
+            # Every point outside ring r-1 is at least this far away; a
+            # longitude degree is shortest at the highest latitude reached
+            edge_lat = min(89.9, abs(lat) + r * self.cell_deg)
+            reach = max(r - 1, 0) * self.cell_deg * KM_PER_DEG * math.cos(math.radians(edge_lat))
+            if radius_km is not None and reach > radius_km:
+                break
+            if len(best_dist) >= k and reach > best_dist[-1]:
+                break
+            hits = self._ring(cx, cy, r)
+            if not hits:
+                continue
+            idx = np.concatenate([np.arange(s, e) for s, e in hits])
+            dist = haversine_km(lat, lng, self.lats[idx], self.lngs[idx])
+            if radius_km is not None:
+                keep = dist <= radius_km
+                idx, dist = idx[keep], dist[keep]
+            best_pos = np.concatenate([best_pos, idx])
+            best_dist = np.concatenate([best_dist, dist])
+            if len(best_dist) > k:
+                top = np.argpartition(best_dist, k - 1)[:k]
+                best_pos, best_dist = best_pos[top], best_dist[top]
+            order = np.argsort(best_dist, kind='stable')
+            best_pos, best_dist = best_pos[order], best_dist[order]
+
+        return self.positions[best_pos], best_dist
@@ -0,0 +1,499 @@
+"""Incremental ingest of place feeds into the catalogue.
+
+    python ingest.py feed.ndjson --target places.csv --chunk-size 50000
+
+A feed is NDJSON (``.ndjson``/``.jsonl``) or CSV, UTF-8 or Latin-1, read
+``--chunk-size`` rows at a time. Each chunk is normalized exactly like the catalogue
+(``normalize_places``), and every row is applied as a delta:
+
+* a row whose ``op`` column is ``delete`` removes the matching place
+* any other row is an upsert: it updates the matching place or adds one
+
+An update only sets the fields the feed row has (present and not null); the
+place keeps its other values, so a feed can send just the columns that
+changed. New places get the usual defaults for anything left out.
+
+Rows match by ``id`` or, when the feed row has none or one the catalogue
+does not have, by place name and location (case-insensitive), so a feed
+cannot add a second copy of a known place under a new id. New places without
+an id get the next free id. Within a feed the last row for a place wins.
+
+Memory stays bounded by the chunk size. Accepted rows are spilled to
+temporary snapshot files next to the catalogue as they are read, and the
+merge streams the catalogue (mapped from its snapshot) a chunk at a time into
+the new CSV and snapshot: unchanged rows are copied, replaced rows keep their
+position and new rows are appended. What is held for the whole run is a few
+integers per catalogue row and per feed row (ids, name keys and where each
+spilled row is).
+
+The new CSV is written together with its snapshot and only then swapped in.
+The snapshot also records which rows were removed, replaced and appended, so
+running API workers and the Streamlit app update their indexes for just those
+rows on their next check (see ``places_store``) instead of rebuilding them.
+"""
+import argparse
+import codecs
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from places_columns import CATEGORICAL_COLUMNS, compact_frame, expand_frame
+from places_snapshot import SnapshotWriter, load_cached, map_snapshot, snapshot_path
+from places_store import DATA_FILE, REQUIRED_COLUMNS, SNAPSHOT_VARIANT, add_coordinates, load_places, normalize_places
+
+DEFAULT_CHUNK_ROWS = 50_000
+
+# Feed column that marks a row as a delete ('delete') rather than an upsert
+OP_COLUMN = 'op'
+
+
+def feed_encoding(path):
+    """'utf-8' if the whole file decodes as UTF-8, else Latin-1"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(path, 'rb') as f:
+        try:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                decoder.decode(block)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            # Older hand-edited exports are Latin-1
+            return 'ISO-8859-1'
+    return 'utf-8'
+
+
+def read_feed(path, chunk_size=DEFAULT_CHUNK_ROWS):
+    """Yield the raw rows of a CSV or NDJSON feed as DataFrames of up to ``chunk_size`` rows"""
+    # Checked up front: a decode error halfway through would leave
+    # earlier chunks applied
+    encoding = feed_encoding(path)
+    if path.endswith(('.ndjson', '.jsonl')):
+        # dtype=False keeps values as written; normalize_places coerces them
+        reader = pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False, encoding=encoding)
+    else:
+        reader = pd.read_csv(path, chunksize=chunk_size, encoding=encoding)
+    with reader:
+        yield from reader
+
+
+def place_keys(names, locations):
+    """64-bit hash of the case-insensitive (place name, location) of each row"""
+    def clean(values):
+        return values.astype(str).fillna('').str.strip().str.casefold()
+    keys = clean(pd.Series(names)) + '\x1f' + clean(pd.Series(locations))
+    return pd.util.hash_array(keys.to_numpy(dtype=object))
+
+
+def given_fields(chunk):
+    """Which catalogue columns each raw feed row sets (present and not null)"""
+    given = {col: chunk[col].notna().to_numpy() for col in chunk.columns if col != 'id'}
+    # Coordinates come from the coordinates column, else from the map link
+    coordinates = given.pop('coordinates', given.get('map_link'))
+    if coordinates is not None:
+        given['lat'] = given['lng'] = coordinates
+    return pd.DataFrame(given, index=chunk.index)
+
+
+# Columns every normalized and compacted feed chunk has
+_BASE_COLUMNS = set(REQUIRED_COLUMNS) | {'lat', 'lng'}
+
+
+def _signature(path):
+    st = os.stat(path)
+    return {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+
+
+def _spill(df, path):
+    writer = SnapshotWriter(path)
+    try:
+        writer.append(df)
+        writer.close({})
+    finally:
+        writer.discard()
+
+
+def _text(series):
+    """Object array of str (None where missing); other values become their str()"""
+    values = series.to_numpy(dtype=object, na_value=None, copy=True)
+    values[pd.isna(values)] = None
+    dtype = series.dtype.categories.dtype if isinstance(series.dtype, pd.CategoricalDtype) else series.dtype
+    if pd.api.types.is_string_dtype(dtype) and dtype != object:
+        return values
+    odd = [i for i, v in enumerate(values.tolist()) if v is not None and not isinstance(v, str)]
+    for i in odd:
+        values[i] = str(values[i])
+    return values
+
+
+def _column_kind(series):
+    """How a catalogue column is carried through the merge"""
+    if series.name == 'id':
+        return 'int'
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return 'category'
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return 'bool'
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        # Float, so rows that leave it out can hold NaN
+        return 'float'
+    return 'text'
+
+
+def _plain(frame, schema):
+    """Writable NumPy arrays of ``frame``'s columns, conformed to ``schema``
+
+    Columns ``frame`` lacks come back empty (NaN, None or False).
+    """
+    n = len(frame)
+    arrays = {}
+    for name, kind in schema:
+        series = frame[name] if name in frame.columns else None
+        if kind == 'int':
+            values = np.zeros(n, dtype=np.int64) if series is None else series.to_numpy(dtype=np.int64, copy=True)
+        elif kind == 'float':
+            if series is None:
+                values = np.full(n, np.nan)
+            elif pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+                values = series.to_numpy(dtype=float, na_value=np.nan, copy=True)
+            else:
+                values = pd.to_numeric(pd.Series(_text(series)), errors='coerce').to_numpy(dtype=float)
+        elif kind == 'bool':
+            values = np.zeros(n, dtype=bool) if series is None else \
+                series.fillna(False).to_numpy(dtype=bool, copy=True)
+        else:
+            values = np.full(n, None, dtype=object) if series is None else _text(series)
+        arrays[name] = values
+    return arrays
+
+
+def _frame(arrays, schema):
+    """Inverse of ``_plain``: the compact frame written to the CSV and snapshot"""
+    return pd.DataFrame({
+        name: pd.Categorical(arrays[name]) if kind == 'category' else arrays[name]
+        for name, kind in schema
+    })
+
+
+class Ingest:
+    """Deltas from one feed, resolved against the current catalogue
+
+    Accepted upserts are spilled chunk by chunk to snapshot files in
+    ``spill_dir`` (not kept when it is None, e.g. for a dry run); what stays
+    in memory is the place id, delete flag and spill location of every
+    accepted feed row.
+    """
+
+    def __init__(self, catalogue, spill_dir=None, chunk_size=DEFAULT_CHUNK_ROWS):
+        self.catalogue = catalogue
+        self.spill_dir = spill_dir
+        self.chunk_size = chunk_size
+        if catalogue is None:
+            self.ids = np.empty(0, dtype=np.int64)
+            self._by_key = pd.Series([], dtype=np.int64)
+        else:
+            if not pd.api.types.is_integer_dtype(catalogue['id'].dtype):
+                raise ValueError('Incremental ingest needs integer place ids')
+            self.ids = catalogue['id'].to_numpy()
+            # Hashed a chunk at a time, so the key strings never all exist at once
+            keys = [place_keys(catalogue['place_name'].iloc[start:start + chunk_size],
+                               catalogue['location'].iloc[start:start + chunk_size])
+                    for start in range(0, len(catalogue), chunk_size)]
+            keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.uint64)
+            by_key = pd.Series(self.ids, index=keys)
+            self._by_key = by_key[~by_key.index.duplicated(keep='last')]
+        self._sorted_ids = np.sort(self.ids)
+        self.next_id = int(self.ids.max()) + 1 if len(self.ids) else 1
+        # (name, location) key -> id, for places first seen in this feed
+        self._new_keys = {}
+        # Ids the catalogue lacks that the feed introduced as new places, and
+        # those that turned out to name a known place -> that place's id
+        self._feed_ids = set()
+        self._aliases = {}
+        # Per chunk, for its accepted rows: place id, delete flag and row in the spill
+        self._ids, self._deletes, self._spill_rows = [], [], []
+        # Per chunk: the spilled upserts and which fields each set, once mapped
+        self._spills = []
+        # Feed columns the catalogue does not have -> whether all their values are numeric
+        self.extra = {}
+        self.rows = 0
+        self.rejected = 0
+
+    def _in_catalogue(self, ids):
+        at = np.minimum(np.searchsorted(self._sorted_ids, ids), max(len(self._sorted_ids) - 1, 0))
+        return self._sorted_ids[at] == ids if len(self._sorted_ids) else np.zeros(len(ids), dtype=bool)
+
+    def _match(self, key):
+        """Id of the known place with this (name, location) key, or None"""
+        place_id = self._new_keys.get(key)
+        if place_id is None and key in self._by_key.index:
+            place_id = int(self._by_key[key])
+        return place_id
+
+    def _resolve(self, raw_ids, keys, deletes, named):
+        """Place id of every feed row (-1 if it cannot be matched or assigned)"""
+        ids = np.full(len(keys), -1, dtype=np.int64)
+        given = raw_ids.notna().to_numpy()
+        ids[given] = raw_ids[given].to_numpy(dtype=np.int64)
+
+        # An id the catalogue lacks is only a new place if its name and
+        # location are not already taken; otherwise it updates that place
+        for i in np.flatnonzero(given & ~self._in_catalogue(ids)).tolist():
+            place_id = int(ids[i])
+            if place_id in self._aliases:
+                ids[i] = self._aliases[place_id]
+            elif place_id not in self._feed_ids and not deletes[i]:
+                found = self._match(keys[i]) if named[i] else None
+                if found is None or found == place_id:
+                    self._feed_ids.add(place_id)
+                    if named[i]:
+                        self._new_keys[keys[i]] = place_id
+                else:
+                    self._aliases[place_id] = ids[i] = found
+
+        unknown = np.flatnonzero(~given)
+        if len(unknown):
+            known = self._by_key.reindex(keys[unknown]).to_numpy(dtype=float, na_value=np.nan)
+            for i, found in zip(unknown.tolist(), known.tolist()):
+                place_id = self._new_keys.get(keys[i])
+                if place_id is None and found == found:
+                    place_id = int(found)
+                if place_id is None and not deletes[i]:
+                    place_id = self.next_id
+                    self.next_id += 1
+                    self._new_keys[keys[i]] = place_id
+                if place_id is not None:
+                    ids[i] = place_id
+        return ids
+
+    def add(self, chunk):
+        """Apply one chunk of raw feed rows"""
+        self.rows += len(chunk)
+        chunk.columns = [str(c).strip() for c in chunk.columns]
+        deletes = np.zeros(len(chunk), dtype=bool)
+        if OP_COLUMN in chunk.columns:
+            deletes = chunk.pop(OP_COLUMN).astype(str).str.strip().str.lower().eq('delete').to_numpy()
+        raw_ids = pd.to_numeric(chunk['id'], errors='coerce') if 'id' in chunk.columns \
+            else pd.Series(np.nan, index=chunk.index)
+        # Fractional ids cannot be matched to anything
+        bad = raw_ids.notna().to_numpy() & (raw_ids.to_numpy(dtype=float, na_value=np.nan) % 1 != 0)
+        raw_ids = raw_ids.where(~bad)
+
+        chunk = chunk.reset_index(drop=True)
+        given = given_fields(chunk)
+        chunk = normalize_places(chunk)
+        keys = place_keys(chunk['place_name'], chunk['location'])
+        named = chunk['place_name'].str.strip().ne('').to_numpy()
+        ids = self._resolve(raw_ids.reset_index(drop=True), keys, deletes, named)
+        valid = ~bad & (ids >= 0)
+        self.rejected += int((~valid).sum())
+        chunk['id'] = ids
+        self.next_id = max(self.next_id, int(ids.max()) + 1 if len(ids) else 1)
+
+        upserts = valid & ~deletes
+        for i in np.flatnonzero(upserts).tolist():
+            self._new_keys[keys[i]] = int(ids[i])
+        self._ids.append(ids[valid])
+        self._deletes.append(deletes[valid])
+        self._spill_rows.append((np.cumsum(upserts) - 1)[valid].astype(np.int32))
+
+        kept = compact_frame(add_coordinates(chunk[upserts].reset_index(drop=True)))
+        for name in kept.columns:
+            if name in _BASE_COLUMNS or self.catalogue is not None and name in self.catalogue.columns:
+                continue
+            values = kept[name]
+            numeric = pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype) \
+                or pd.to_numeric(values, errors='coerce').notna().sum() == values.notna().sum()
+            self.extra[name] = self.extra.get(name, True) and numeric
+        if self.spill_dir is None or not upserts.any():
+            self._spills.append(None)
+            return
+        # Spilled as text where the feed had mixed values; the merge conforms them
+        for name in kept.columns:
+            if kept[name].dtype == object:
+                kept[name] = _text(kept[name])
+        path = os.path.join(self.spill_dir, f'{len(self._spills)}')
+        _spill(kept, f'{path}.rows')
+        _spill(given[upserts].reset_index(drop=True), f'{path}.given')
+        self._spills.append(path)
+
+    def _spilled(self, number):
+        path = self._spills[number]
+        if isinstance(path, str):
+            self._spills[number] = (map_snapshot(f'{path}.rows'), map_snapshot(f'{path}.given'))
+        return self._spills[number]
+
+    def plan(self):
+        """What the feed does to the catalogue: counts and the row changes
+
+        The row changes are the catalogue positions to remove, those to
+        rewrite (with the feed row replacing each and whether it is merged
+        with the old row) and the feed rows to append, in feed order. Feed
+        rows are numbered across chunks in the order they were accepted.
+        """
+        ids = np.concatenate(self._ids) if self._ids else np.empty(0, dtype=np.int64)
+        deletes = np.concatenate(self._deletes) if self._deletes else np.empty(0, dtype=bool)
+        # The last row for each place wins; a delete anywhere before it means
+        # an upsert starts afresh instead of updating the old row
+        order = np.argsort(ids, kind='stable')
+        grouped = ids[order]
+        final = order[np.r_[grouped[1:] != grouped[:-1], True][:len(ids)]]
+        deleted = np.isin(ids[final], ids[deletes])
+        upserted = ~deletes[final]
+        # Where each accepted feed row was spilled, for the merge
+        self._chunk_of = np.repeat(np.arange(len(self._ids)), [len(c) for c in self._ids])
+        self._spill_row_of = np.concatenate(self._spill_rows) if self._spill_rows else np.empty(0, dtype=np.int32)
+
+        existing = pd.Series(np.arange(len(self.ids)), index=self.ids)
+        existing = existing[~existing.index.duplicated(keep='last')]
+        old_pos = existing.reindex(ids[final]).to_numpy(dtype=float, na_value=np.nan)
+        in_catalogue = ~np.isnan(old_pos)
+        old_pos = np.where(in_catalogue, old_pos, -1).astype(np.intp)
+
+        counts = {
+            'feed_rows': self.rows,
+            'rejected': self.rejected,
+            'inserted': int((upserted & ~in_catalogue).sum()),
+            'updated': int((upserted & in_catalogue).sum()),
+            'deleted': int((~upserted & in_catalogue).sum()),
+            'delete_missing': int((~upserted & ~in_catalogue).sum()),
+        }
+
+        # Earlier duplicates of a touched id go, as the feed row replaces the last one
+        stale = np.isin(self.ids, ids[final[in_catalogue]])
+        stale[old_pos[in_catalogue]] = False
+        replace = upserted & in_catalogue
+        by_pos = np.argsort(old_pos[replace])
+        changes = {
+            'removed': np.sort(np.concatenate([old_pos[~upserted & in_catalogue], np.flatnonzero(stale)])),
+            'changed': old_pos[replace][by_pos],
+            'replacements': final[replace][by_pos],
+            'merge': ~deleted[replace][by_pos],
+            'appended': np.sort(final[upserted & ~in_catalogue]),
+        }
+        return counts, changes
+
+    def schema(self):
+        """(name, kind) of the output columns: the catalogue's, then new feed columns"""
+        if self.catalogue is not None:
+            schema = [(name, _column_kind(self.catalogue[name])) for name in self.catalogue.columns]
+        else:
+            first = next(self._spilled(i)[0] for i, path in enumerate(self._spills) if path is not None)
+            schema = [(name, 'category' if name in CATEGORICAL_COLUMNS else _column_kind(first[name]))
+                      for name in first.columns if name not in self.extra]
+        known = {name for name, _ in schema}
+        schema += [(name, 'float' if numeric else 'text')
+                   for name, numeric in self.extra.items() if name not in known]
+        return schema
+
+    def _gather(self, rows, schema):
+        """Plain column arrays of the spilled feed ``rows``, and which fields each set"""
+        chunk_of = self._chunk_of[rows]
+        spill_rows = self._spill_row_of[rows]
+        order = np.argsort(chunk_of, kind='stable')
+        parts, given = [], []
+        for number in np.unique(chunk_of).tolist():
+            frame, fields = self._spilled(number)
+            take = spill_rows[order][chunk_of[order] == number]
+            parts.append(_plain(frame.iloc[take], schema))
+            given.append({name: fields[name].to_numpy()[take] if name in fields.columns
+                          else np.zeros(len(take), dtype=bool) for name, _ in schema})
+        back = np.empty(len(order), dtype=np.intp)
+        back[order] = np.arange(len(order))
+
+        def join(part):
+            return {name: np.concatenate([p[name] for p in part])[back] for name, _ in schema}
+        return join(parts), join(given)
+
+    def frames(self, changes, schema):
+        """Yield the new catalogue as compact frames of about ``chunk_size`` rows"""
+        removed, changed = changes['removed'], changes['changed']
+        yielded = False
+        for start in range(0, len(self.ids), self.chunk_size):
+            end = min(start + self.chunk_size, len(self.ids))
+            arrays = _plain(self.catalogue.iloc[start:end], schema)
+            lo, hi = np.searchsorted(changed, [start, end])
+            if hi > lo:
+                at = changed[lo:hi] - start
+                rows, given = self._gather(changes['replacements'][lo:hi], schema)
+                merge = changes['merge'][lo:hi]
+                for name, _ in schema:
+                    # Updates keep the old value of every field the feed row left out
+                    put = ~(merge & ~given[name])
+                    arrays[name][at[put]] = rows[name][put]
+            keep = np.ones(end - start, dtype=bool)
+            a, b = np.searchsorted(removed, [start, end])
+            keep[removed[a:b] - start] = False
+            yielded = True
+            yield _frame({name: values[keep] for name, values in arrays.items()}, schema)
+        appended = changes['appended']
+        for start in range(0, len(appended), self.chunk_size):
+            rows, _ = self._gather(appended[start:start + self.chunk_size], schema)
+            yielded = True
+            yield _frame(rows, schema)
+        if not yielded:
+            yield _frame(_plain(pd.DataFrame(index=range(0)), schema), schema)
+
+
+def write_catalogue(frames, target, base=None, delta=None):
+    """Write ``frames`` as the CSV at ``target`` plus its snapshot, then swap the CSV in
+
+    ``delta`` (with ``base``, the signature of the CSV it replaces) is
+    recorded in the snapshot for running stores to update from.
+    """
+    tmp = f'{target}.{os.getpid()}.tmp'
+    writer = SnapshotWriter(snapshot_path(target, SNAPSHOT_VARIANT))
+    try:
+        with open(tmp, 'w', encoding='utf-8', newline='') as f:
+            for i, df in enumerate(frames):
+                expand_frame(df).to_csv(f, header=i == 0, index=False)
+                writer.append(df)
+        # os.replace keeps mtime and size, so the snapshot is already current
+        # when the new CSV appears
+        writer.close(_signature(tmp), None if base is None else dict(delta, base=base))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    finally:
+        writer.discard()
+    os.replace(tmp, target)
+
+
+def ingest(feed_path, target=DATA_FILE, chunk_size=DEFAULT_CHUNK_ROWS, dry_run=False):
+    """Apply the feed at ``feed_path`` to the catalogue at ``target``; returns the counts"""
+    base = _signature(target) if os.path.exists(target) else None
+    catalogue = None if base is None else load_cached(target, SNAPSHOT_VARIANT, load_places, base)
+    folder = os.path.dirname(os.path.abspath(target))
+    with tempfile.TemporaryDirectory(prefix='.ingest-', dir=folder) as spill_dir:
+        job = Ingest(catalogue, None if dry_run else spill_dir, chunk_size)
+        for chunk in read_feed(feed_path, chunk_size):
+            job.add(chunk)
+        counts, changes = job.plan()
+        n = len(job.ids)
+        counts['rows'] = n - len(changes['removed']) + len(changes['appended'])
+        if dry_run or (catalogue is None and not len(changes['appended'])):
+            return counts
+        delta = {'rows': n, 'removed': changes['removed'], 'changed': changes['changed'],
+                 'appended': len(changes['appended'])}
+        write_catalogue(job.frames(changes, job.schema()), target, base, delta)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply a CSV/NDJSON place feed to the catalogue as upserts and deletes.')
+    parser.add_argument('feed')
+    parser.add_argument('--target', default=DATA_FILE, help='catalogue CSV to update')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_ROWS, help='feed rows read at a time')
+    parser.add_argument('--dry-run', action='store_true', help='report the changes without writing them')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = ingest(args.feed, args.target, args.chunk_size, args.dry_run)
+    print(', '.join(f'{name}: {value:,}' for name, value in counts.items()))
+    print(f"{'Checked' if args.dry_run else 'Updated'} {args.target} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
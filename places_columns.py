@@ -0,0 +1,140 @@
+"""Compact, column-oriented storage for places frames.
+
+Frames keep one typed array per column instead of Python objects per row:
+
+* low-cardinality text columns (category, subcategory, best time, location)
+  are dictionary-encoded as pandas categoricals: small integer codes plus
+  one shared string per distinct value
+* ``coordinates`` is split into float ``lat``/``lng`` columns, NaN where a
+  place has none
+* numbers and flags stay NumPy arrays; with a snapshot these, the codes and
+  the long free-text columns are memory-mapped, so workers share one copy
+
+``RecordStore`` rebuilds the familiar record dicts on demand, a column at a
+time for a batch of rows, so nothing per row is kept alive between requests.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional: text columns are gathered through pandas instead
+    pa = None
+
+CATEGORICAL_COLUMNS = ('category', 'subcategory', 'best_time_to_visit', 'location')
+
+# Only dictionary-encode a column if it has at most this share of distinct values
+MAX_DISTINCT_RATIO = 0.5
+
+
+def compact_frame(df):
+    """Dictionary-encode low-cardinality columns and split coordinates, in place"""
+    for name in CATEGORICAL_COLUMNS:
+        if name not in df.columns or isinstance(df[name].dtype, pd.CategoricalDtype):
+            continue
+        if df[name].nunique(dropna=True) <= max(1, len(df) * MAX_DISTINCT_RATIO):
+            df[name] = df[name].astype('category')
+
+    if 'coordinates' in df.columns:
+        lats = np.full(len(df), np.nan)
+        lngs = np.full(len(df), np.nan)
+        for i, coords in enumerate(df['coordinates'].tolist()):
+            if coords is not None and not (isinstance(coords, float) and math.isnan(coords)) and len(coords) == 2:
+                lats[i], lngs[i] = coords
+        at = df.columns.get_loc('coordinates')
+        df.drop(columns='coordinates', inplace=True)
+        df.insert(at, 'lat', lats)
+        df.insert(at + 1, 'lng', lngs)
+    return df
+
+
+def expand_frame(df):
+    """Undo the coordinate split of ``compact_frame``, as a new frame
+
+    ``lat``/``lng`` become one ``coordinates`` column of [lat, lng] lists
+    (None where unknown), which is how the CSV stores them.
+    """
+    if 'lat' not in df.columns or 'lng' not in df.columns:
+        return df
+    lat = df['lat'].to_numpy(dtype=float).tolist()
+    lng = df['lng'].to_numpy(dtype=float).tolist()
+    coordinates = pd.Series([None if a != a else [a, b] for a, b in zip(lat, lng)],
+                            index=df.index, dtype=object)
+    at = df.columns.get_loc('lat')
+    out = df.drop(columns=['lat', 'lng'])
+    out.insert(at, 'coordinates', coordinates)
+    return out
+
+
+def _clean(values):
+    """Map pandas/NumPy missing markers in a list of values to None"""
+    return [None if v is None or v is pd.NA or (isinstance(v, float) and math.isnan(v)) else v
+            for v in values]
+
+
+class RecordStore:
+    """Sequence of record dicts built on demand from the columns of a frame"""
+
+    def __init__(self, df):
+        self.size = len(df)
+        self.fields = []
+        self._columns = {}
+        for name in df.columns:
+            if name == 'lng':
+                continue
+            if name == 'lat':
+                self.fields.append('coordinates')
+                self._columns['coordinates'] = self._coordinates(df['lat'], df['lng'])
+            else:
+                self.fields.append(name)
+                self._columns[name] = self._column(df[name])
+
+    def _column(self, series):
+        """Function taking row positions to a list of Python values"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy()
+            values = np.array(_clean(list(series.cat.categories)) + [None], dtype=object)
+            # Code -1 (missing) picks the trailing None
+            return lambda positions: values[codes[positions]].tolist()
+
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biuf':
+            arr = series.to_numpy()
+            if arr.dtype.kind == 'f' and np.isnan(arr).any():
+                return lambda positions: _clean(arr[positions].tolist())
+            return lambda positions: arr[positions].tolist()
+
+        if pa is not None and hasattr(series.array, '__arrow_array__'):
+            # Arrow-backed text (memory-mapped from a snapshot): gather in Arrow,
+            # nulls come out as None
+            chunked = series.array.__arrow_array__()
+            return lambda positions: chunked.take(positions).to_pylist()
+
+        has_missing = bool(series.isna().any())
+        arr = series.array
+        if has_missing:
+            return lambda positions: _clean(arr.take(positions).tolist())
+        return lambda positions: arr.take(positions).tolist()
+
+    def _coordinates(self, lat, lng):
+        lat = lat.to_numpy(dtype=float)
+        lng = lng.to_numpy(dtype=float)
+
+        def take(positions):
+            return [None if a != a else [a, b]
+                    for a, b in zip(lat[positions].tolist(), lng[positions].tolist())]
+        return take
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, pos):
+        return self.take(np.array([pos]))[0]
+
+    def take(self, positions, fields=None):
+        """Records at the given row positions, limited to ``fields`` if given"""
+        positions = np.asarray(positions, dtype=np.intp)
+        fields = self.fields if fields is None else fields
+        columns = [self._columns[f](positions) for f in fields]
+        return [dict(zip(fields, row)) for row in zip(*columns)] if columns else [{} for _ in positions]
@@ -0,0 +1,48 @@
+"""Row-level changes between two versions of the places frame.
+
+An ingest (``ingest.py``) removes some rows, rewrites others in place and
+appends new ones, and records which in the snapshot it writes. ``RowDelta``
+turns that into the position mapping the indexes need to build the next
+version from the previous one: rows that did not change keep their relative
+order, so their postings, sort orders and grid cells only get renumbered,
+and just the rewritten and appended rows are indexed from scratch.
+"""
+import numpy as np
+
+
+class RowDelta:
+    """How the rows of one version of the frame map onto the next"""
+
+    def __init__(self, old_size, removed=(), changed=(), appended=0):
+        removed = np.asarray(removed, dtype=np.intp)
+        changed = np.asarray(changed, dtype=np.intp)
+        self.old_size = old_size
+        kept = np.ones(old_size, dtype=bool)
+        kept[removed] = False
+        # New position of every old row, -1 where it was removed
+        self.moved = np.full(old_size, -1, dtype=np.intp)
+        self.moved[kept] = np.arange(int(kept.sum()))
+        self.size = int(kept.sum()) + appended
+        # Old rows carried over as they were
+        self.unchanged = kept
+        self.unchanged[changed] = False
+        # New positions of the appended rows, and of those plus the rewritten ones
+        self.appended = np.arange(self.size - appended, self.size)
+        self.fresh = np.sort(np.concatenate([self.moved[changed], self.appended]))
+
+    def carry(self, positions):
+        """New positions of the unchanged rows among old ``positions``, in the same order"""
+        positions = np.asarray(positions, dtype=np.intp)
+        return self.moved[positions[self.unchanged[positions]]]
+
+
+def merge_sorted(keys, values, new_keys, new_values):
+    """Insert ``new_values`` into ``values``, which is sorted by ``keys``
+
+    Returns the merged keys and values. Ties go after the existing entries;
+    NaN keys sort last, as in ``np.sort``.
+    """
+    order = np.argsort(new_keys, kind='stable')
+    new_keys, new_values = new_keys[order], new_values[order]
+    at = np.searchsorted(keys, new_keys, side='right')
+    return np.insert(keys, at, new_keys), np.insert(values, at, new_values)
@@ -0,0 +1,272 @@
+"""Secondary indexes over a places DataFrame.
+
+Built once per loaded version of the data so filter queries never scan the
+whole frame:
+
+* category / subcategory -> sorted row positions (inverted index)
+* spooky -> packed boolean bitmap
+* distance -> row positions ordered by distance, for binary-search ranges
+
+A query takes the most selective predicate as its candidate set and checks
+the remaining predicates only against those candidates.
+
+``facets`` counts rows per value of every filterable field in one bincount
+per field over the codes, never touching the frame.
+
+Given the previous version's index and a ``RowDelta``, the postings and the
+distance order are carried over and renumbered, and only the rewritten and
+appended rows are coded and merged in; the bitmaps and distance buckets are
+plain array passes over the mapped columns and are recomputed.
+"""
+import numpy as np
+import pandas as pd
+
+from places_delta import merge_sorted
+
+# Upper bounds (km) of the distance facet's buckets; the last one is open-ended
+DISTANCE_BUCKETS = (10, 25, 50, 100, 200)
+
+
+class CodedColumn:
+    """Dictionary-encoded column with an inverted index from value to rows"""
+
+    def __init__(self, values, previous=None, delta=None):
+        if previous is None:
+            codes, uniques = pd.factorize(values, use_na_sentinel=True)
+            codes = codes.astype(np.int32)
+            self.values = list(uniques)
+            self.lookup = {v: i for i, v in enumerate(self.values)}
+            # Row positions grouped by code; a stable sort keeps each group sorted
+            order = np.argsort(codes, kind='stable')
+            order = order[int((codes < 0).sum()):]
+        else:
+            codes, order = self._update(values, previous, delta)
+        self._index(codes, order)
+
+    def _update(self, values, previous, delta):
+        """Codes and grouped positions from ``previous``, recoding only fresh rows"""
+        self.values = list(previous.values)
+        self.lookup = dict(previous.lookup)
+        codes = np.full(delta.size, -1, dtype=np.int32)
+        old = np.flatnonzero(delta.unchanged)
+        codes[delta.moved[old]] = previous.codes[old]
+
+        fresh = delta.fresh
+        fresh_codes, uniques = pd.factorize(values.iloc[fresh], use_na_sentinel=True)
+        # The trailing -1 is what the missing-value code -1 picks
+        table = np.full(len(uniques) + 1, -1, dtype=np.int32)
+        for i, value in enumerate(uniques):
+            if value not in self.lookup:
+                self.lookup[value] = len(self.values)
+                self.values.append(value)
+            table[i] = self.lookup[value]
+        codes[fresh] = table[fresh_codes]
+
+        # Carried rows stay grouped by code and sorted within each group
+        carried = delta.carry(previous.order)
+        fresh = fresh[codes[fresh] >= 0]
+        _, order = merge_sorted(codes[carried].astype(np.int64) * delta.size + carried, carried,
+                                codes[fresh].astype(np.int64) * delta.size + fresh, fresh)
+
+        # Values no row has any more are dropped, as a rebuild would
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.values))
+        if (counts == 0).any():
+            keep = counts > 0
+            renumber = np.append(np.cumsum(keep) - 1, -1).astype(np.int32)
+            codes = renumber[codes]
+            self.values = [v for v, k in zip(self.values, keep.tolist()) if k]
+            self.lookup = {v: i for i, v in enumerate(self.values)}
+        return codes, order
+
+    def _index(self, codes, order):
+        self.codes = codes
+        self.order = order
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.values))
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        self.postings = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.values))]
+
+    def code_set(self, wanted):
+        """Codes of the wanted values that actually occur in the column"""
+        return [self.lookup[v] for v in wanted if v in self.lookup]
+
+    def positions(self, codes):
+        if len(codes) == 1:
+            return self.postings[codes[0]]
+        if not codes:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate([self.postings[c] for c in codes]))
+
+    def count(self, codes):
+        return sum(len(self.postings[c]) for c in codes)
+
+    def check(self, candidates, codes):
+        if len(codes) == 1:
+            return candidates[self.codes[candidates] == codes[0]]
+        return candidates[np.isin(self.codes[candidates], codes)]
+
+
+def _as_list(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+class PlacesIndex:
+    """Index layer used to answer filter queries without full scans
+
+    With ``previous`` (the index of the version before ``df``) and the
+    ``RowDelta`` between them, it is updated from that index instead of
+    being built from scratch.
+    """
+
+    def __init__(self, df, previous=None, delta=None):
+        self.size = len(df)
+        if previous is not None and (previous.subcategory is previous.category) != ('subcategory' not in df.columns):
+            # The subcategory fallback changed, so nothing lines up
+            previous = None
+
+        def coded(name, column):
+            if previous is None or getattr(previous, name) is None:
+                return CodedColumn(df[column])
+            return CodedColumn(df[column], getattr(previous, name), delta)
+
+        self.category = coded('category', 'category')
+        if 'subcategory' in df.columns:
+            self.subcategory = coded('subcategory', 'subcategory')
+        else:
+            # Same fallback as the Streamlit loader: subcategory == category
+            self.subcategory = self.category
+
+        spooky = df['spooky'].fillna(False).to_numpy(dtype=bool)
+        self.spooky_bits = np.packbits(spooky)
+        self.spooky_true = np.flatnonzero(spooky)
+        self.spooky_false = np.flatnonzero(~spooky)
+
+        self.best_time = coded('best_time', 'best_time_to_visit') if 'best_time_to_visit' in df.columns else None
+
+        distance = pd.to_numeric(df['distance_from_pune_km'], errors='coerce').to_numpy(dtype=float)
+        self.distance = distance
+        # Bucket of each row for the distance facet; unknown distances get the last one
+        bounds = [0] + list(DISTANCE_BUCKETS)
+        self.distance_labels = [f'{a}-{b} km' for a, b in zip(bounds, bounds[1:])]
+        self.distance_labels += [f'{bounds[-1]}+ km', 'unknown']
+        buckets = np.searchsorted(np.array(DISTANCE_BUCKETS, dtype=float), distance, side='left')
+        buckets[np.isnan(distance)] = len(self.distance_labels) - 1
+        self.distance_bucket = buckets.astype(np.int8)
+        # NaN sorts last, so it is never inside a "<= max" prefix
+        if previous is None:
+            self.distance_order = np.argsort(distance, kind='stable')
+        else:
+            carried = delta.carry(previous.distance_order)
+            _, self.distance_order = merge_sorted(distance[carried], carried,
+                                                  distance[delta.fresh], delta.fresh)
+        self.distance_sorted = distance[self.distance_order]
+
+    def spooky_mask(self, positions):
+        """Spooky flag for the given row positions, read from the bitmap"""
+        return ((self.spooky_bits[positions >> 3] >> (7 - (positions & 7))) & 1).astype(bool)
+
+    def select(self, categories=None, subcategories=None, max_distance=None, spooky=None):
+        """Sorted row positions matching every given filter
+
+        ``categories``/``subcategories`` may be a single value or a list of
+        accepted values; ``None`` means no filter on that field.
+        """
+        predicates = []
+
+        categories = _as_list(categories)
+        if categories is not None:
+            codes = self.category.code_set(categories)
+            predicates.append((
+                self.category.count(codes),
+                lambda c=codes: self.category.positions(c),
+                lambda cand, c=codes: self.category.check(cand, c),
+            ))
+
+        subcategories = _as_list(subcategories)
+        if subcategories is not None:
+            codes = self.subcategory.code_set(subcategories)
+            predicates.append((
+                self.subcategory.count(codes),
+                lambda c=codes: self.subcategory.positions(c),
+                lambda cand, c=codes: self.subcategory.check(cand, c),
+            ))
+
+        if max_distance is not None:
+            end = int(np.searchsorted(self.distance_sorted, max_distance, side='right'))
+            predicates.append((
+                end,
+                lambda e=end: np.sort(self.distance_order[:e]),
+                lambda cand, m=max_distance: cand[self.distance[cand] <= m],
+            ))
+
+        if spooky is not None:
+            rows = self.spooky_true if spooky else self.spooky_false
+            predicates.append((
+                len(rows),
+                lambda r=rows: r,
+                lambda cand, s=bool(spooky): cand[self.spooky_mask(cand) == s],
+            ))
+
+        if not predicates:
+            return np.arange(self.size)
+
+        predicates.sort(key=lambda p: p[0])
+        candidates = predicates[0][1]()
+        for _, _, check in predicates[1:]:
+            if not len(candidates):
+                break
+            candidates = check(candidates)
+        return candidates
+
+    def _mask(self, column, values):
+        if values is None:
+            return None
+        mask = np.zeros(self.size, dtype=bool)
+        mask[column.positions(column.code_set(values))] = True
+        return mask
+
+    def facets(self, categories=None, subcategories=None, max_distance=None, spooky=None):
+        """Row counts per value of each filterable field, plus the filtered total
+
+        Takes the same filters as ``select``. Each field is counted under the
+        filters on the *other* fields, so the counts say what picking another
+        value would give; ``best_time_to_visit`` (not filterable) is counted
+        under all of them. Values that no row has under those filters count 0.
+        """
+        masks = {
+            'category': self._mask(self.category, _as_list(categories)),
+            'subcategory': self._mask(self.subcategory, _as_list(subcategories)),
+            'distance': None if max_distance is None else self.distance <= max_distance,
+            'spooky': None,
+        }
+        spooky_flags = np.unpackbits(self.spooky_bits, count=self.size).astype(np.int8)
+        if spooky is not None:
+            masks['spooky'] = spooky_flags == int(bool(spooky))
+
+        def rows_except(name):
+            mask = None
+            for other, m in masks.items():
+                if other != name and m is not None:
+                    mask = m if mask is None else mask & m
+            return mask
+
+        def count(codes, labels, mask):
+            if mask is not None:
+                codes = codes[mask]
+            counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+            return {label: int(n) for label, n in zip(labels, counts.tolist())}
+
+        every = rows_except(None)
+        result = {
+            'total': self.size if every is None else int(every.sum()),
+            'category': count(self.category.codes, self.category.values, rows_except('category')),
+            'subcategory': count(self.subcategory.codes, self.subcategory.values, rows_except('subcategory')),
+            'spooky': dict(zip(('false', 'true'), count(spooky_flags, (0, 1), rows_except('spooky')).values())),
+            'distance': count(self.distance_bucket, self.distance_labels, rows_except('distance')),
+        }
+        if self.best_time is not None:
+            result['best_time_to_visit'] = count(self.best_time.codes, self.best_time.values, every)
+        return result
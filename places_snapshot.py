@@ -0,0 +1,432 @@
+"""Compiled binary snapshots of the places CSV.
+
+A snapshot is a single file holding an already-parsed and normalized frame:
+numeric and boolean columns as raw arrays, text columns as an offsets array
+plus one UTF-8 blob (Arrow's large_string layout), and categorical columns as
+a codes array plus their distinct values in the text layout. Loading memory-maps the
+file, so numeric columns are used in place and every worker shares the same
+page-cached copy; with pyarrow installed, text columns are mapped without
+copying as well.
+
+Each snapshot records the mtime/size of the CSV it came from and is ignored
+(and rebuilt) as soon as the CSV changes. ``SnapshotWriter`` writes one a
+chunk of rows at a time; the ingest also records which rows changed since the
+previous CSV (``read_delta``). Build one ahead of time with
+
+    python places_snapshot.py places.csv
+"""
+import argparse
+import json
+import os
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional: text columns are decoded instead of mapped
+    pa = None
+
+MAGIC = b'PWDSNAP1'
+FORMAT_VERSION = 2
+ALIGN = 64
+SNAPSHOT_DIR = '.snapshots'
+
+
+def snapshot_path(csv_path, variant):
+    """Where the snapshot of ``csv_path`` for a given loader variant lives"""
+    folder, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(folder, SNAPSHOT_DIR, f'{name}.{variant}.snap')
+
+
+def _source_signature(csv_path):
+    st = os.stat(csv_path)
+    return {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+
+
+def _is_missing(value):
+    return value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value))
+
+
+def _text_column(values):
+    """Encode a column of str/None into (offsets, blob, nulls)
+
+    Raises TypeError if it holds anything else.
+    """
+    if pa is not None:
+        # Arrow's large_string buffers are already this layout
+        try:
+            arr = pa.array(values, type=pa.large_string(), from_pandas=True)
+        except (pa.ArrowTypeError, pa.ArrowInvalid) as exc:
+            raise TypeError(str(exc)) from None
+        _, offsets_buf, data_buf = arr.buffers()
+        offsets = np.frombuffer(offsets_buf, dtype=np.int64)[arr.offset:arr.offset + len(arr) + 1]
+        blob = bytes(memoryview(data_buf)[offsets[0]:offsets[-1]]) if data_buf is not None else b''
+        nulls = arr.is_null().to_numpy(zero_copy_only=False)
+        return offsets - offsets[0], blob, nulls
+    encoded = []
+    nulls = np.zeros(len(values), dtype=bool)
+    for i, v in enumerate(values):
+        if _is_missing(v):
+            nulls[i] = True
+            encoded.append(b'')
+        elif isinstance(v, str):
+            encoded.append(v.encode('utf-8'))
+        else:
+            raise TypeError(f'Expected str, got {type(v).__name__}')
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, b''.join(encoded), nulls
+
+
+def _codes_dtype(n):
+    """Smallest code dtype pandas uses for ``n`` categories"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+class SnapshotWriter:
+    """Writes a snapshot a chunk of rows at a time
+
+    The first chunk fixes the columns and how each is stored; later chunks
+    must have the same columns. Categorical columns share one dictionary,
+    grown as chunks bring new values. Column data is staged in temporary
+    files next to the snapshot, so memory stays bounded by the chunk size.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.columns = None
+        self._folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(self._folder, exist_ok=True)
+
+    def _stage(self):
+        return tempfile.TemporaryFile(dir=self._folder)
+
+    def _layout(self, df):
+        columns = []
+        for name in df.columns:
+            series = df[name]
+            column = {'name': name}
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                column.update(kind='category', codes=self._stage(), categories=[], lookup={})
+            elif pd.api.types.is_bool_dtype(series.dtype):
+                column.update(kind='array', dtype=np.dtype(bool), data=self._stage())
+            elif pd.api.types.is_numeric_dtype(series.dtype):
+                column.update(kind='array', dtype=series.to_numpy().dtype, data=self._stage())
+            else:
+                # Non-string objects (e.g. coordinate lists) round-trip via JSON
+                json_kind = series.dtype == object and any(
+                    not isinstance(v, str) and not _is_missing(v) for v in series.tolist())
+                column.update(kind='json' if json_kind else 'text', offsets=self._stage(),
+                              data=self._stage(), nulls=self._stage(), end=0, any_null=False)
+                column['offsets'].write(np.zeros(1, dtype=np.int64).tobytes())
+            columns.append(column)
+        return columns
+
+    def append(self, df):
+        """Add the rows of ``df`` after those already written"""
+        if self.columns is None:
+            self.columns = self._layout(df)
+        if list(df.columns) != [c['name'] for c in self.columns]:
+            raise ValueError('Snapshot chunks must all have the same columns')
+        for column in self.columns:
+            series = df[column['name']]
+            kind = column['kind']
+            if kind == 'category':
+                # Map this chunk's values onto the shared dictionary
+                codes, uniques = pd.factorize(series, use_na_sentinel=True)
+                table = np.full(len(uniques) + 1, -1, dtype=np.int32)
+                for i, value in enumerate(uniques):
+                    if value not in column['lookup']:
+                        column['lookup'][value] = len(column['categories'])
+                        column['categories'].append(value)
+                    table[i] = column['lookup'][value]
+                column['codes'].write(table[codes].tobytes())
+            elif kind == 'array':
+                column['data'].write(series.to_numpy(dtype=column['dtype']).tobytes())
+            else:
+                values = series
+                if kind == 'json':
+                    values = [None if _is_missing(v) else json.dumps(v) for v in series.tolist()]
+                try:
+                    offsets, blob, nulls = _text_column(values)
+                except TypeError:
+                    raise TypeError(f'Column {column["name"]!r} mixes text and other values') from None
+                column['offsets'].write((offsets[1:] + column['end']).tobytes())
+                column['data'].write(blob)
+                column['nulls'].write(nulls.tobytes())
+                column['end'] += len(blob)
+                column['any_null'] = column['any_null'] or bool(nulls.any())
+        self.rows += len(df)
+
+    def close(self, signature, delta=None):
+        """Write the snapshot file; ``delta`` is recorded for ``read_delta``
+
+        ``delta`` holds the source signature of the previous version
+        (``base``), its row count (``rows``), the old row positions that were
+        ``removed`` or ``changed`` and the number of ``appended`` rows.
+        """
+        segments = []
+        columns = []
+
+        def add(data):
+            segments.append(data)
+            return len(segments) - 1
+
+        for column in self.columns or []:
+            name, kind = column['name'], column['kind']
+            if kind == 'category':
+                # Codes were staged as int32; store them as pandas would
+                dtype = _codes_dtype(len(column['categories']))
+                codes = column['codes']
+                if dtype != np.int32:
+                    codes.seek(0)
+                    narrowed = self._stage()
+                    for block in iter(lambda: codes.read(1 << 22), b''):
+                        narrowed.write(np.frombuffer(block, dtype=np.int32).astype(dtype).tobytes())
+                    codes.close()
+                    codes = column['codes'] = narrowed
+                offsets, blob, _ = _text_column(column['categories'])
+                columns.append({
+                    'name': name, 'kind': 'category', 'dtype': dtype.str,
+                    'codes': add(codes),
+                    'offsets': add(offsets.tobytes()),
+                    'data': add(blob),
+                    'nulls': None,
+                })
+            elif kind == 'array':
+                columns.append({'name': name, 'kind': 'array', 'dtype': column['dtype'].str,
+                                'data': add(column['data'])})
+            else:
+                columns.append({
+                    'name': name, 'kind': kind,
+                    'offsets': add(column['offsets']),
+                    'data': add(column['data']),
+                    'nulls': add(column['nulls']) if column['any_null'] else None,
+                })
+
+        header = {
+            'format': FORMAT_VERSION, 'source': signature, 'rows': self.rows,
+            'columns': columns,
+        }
+        if delta is not None:
+            header['delta'] = {
+                'base': delta['base'], 'rows': delta['rows'], 'appended': int(delta['appended']),
+                'removed': add(np.asarray(delta['removed'], dtype=np.int64).tobytes()),
+                'changed': add(np.asarray(delta['changed'], dtype=np.int64).tobytes()),
+            }
+        header['segments'] = len(segments)
+
+        sizes = []
+        for seg in segments:
+            if isinstance(seg, bytes):
+                sizes.append(len(seg))
+            else:
+                seg.seek(0, os.SEEK_END)
+                sizes.append(seg.tell())
+
+        # Lay segments out after the header, each aligned for zero-copy views
+        header_bytes = json.dumps(header).encode()
+        # Reserve room for the segment table, whose size doesn't depend on offsets
+        table_size = len(segments) * 16
+        pos = -(-(len(MAGIC) + 8 + len(header_bytes) + table_size) // ALIGN) * ALIGN
+        table = []
+        for size in sizes:
+            table.append((pos, size))
+            pos = -(-(pos + size) // ALIGN) * ALIGN
+
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(header_bytes)))
+            f.write(header_bytes)
+            for offset, size in table:
+                f.write(struct.pack('<QQ', offset, size))
+            for (offset, size), seg in zip(table, segments):
+                f.seek(offset)
+                if isinstance(seg, bytes):
+                    f.write(seg)
+                else:
+                    seg.seek(0)
+                    shutil.copyfileobj(seg, f, 1 << 22)
+            f.truncate(pos)
+        os.replace(tmp, self.path)
+        self.discard()
+        return self.path
+
+    def discard(self):
+        """Drop the staged data without writing a snapshot"""
+        for column in self.columns or []:
+            for key in ('codes', 'data', 'offsets', 'nulls'):
+                staged = column.get(key)
+                if hasattr(staged, 'close'):
+                    staged.close()
+        self.columns = None
+
+
+def write_snapshot(df, csv_path, variant, signature=None, delta=None):
+    """Write ``df`` as the snapshot of ``csv_path``; returns the file path"""
+    writer = SnapshotWriter(snapshot_path(csv_path, variant))
+    try:
+        writer.append(df)
+        return writer.close(signature or _source_signature(csv_path), delta)
+    finally:
+        writer.discard()
+
+
+def _read_header(mm):
+    if bytes(mm[:len(MAGIC)]) != MAGIC:
+        raise ValueError('Not a places snapshot')
+    start = len(MAGIC)
+    (header_len,) = struct.unpack('<Q', bytes(mm[start:start + 8]))
+    start += 8
+    header = json.loads(bytes(mm[start:start + header_len]))
+    start += header_len
+    count = header['segments']
+    table = np.frombuffer(bytes(mm[start:start + count * 16]), dtype='<u8').reshape(-1, 2)
+    table = [(int(offset), int(size)) for offset, size in table]
+    return header, table
+
+
+def _decode_text(mm, table, column):
+    """Python strings (None for nulls) of a column in the text layout"""
+    off_start, off_size = table[column['offsets']]
+    data_start, data_size = table[column['data']]
+    offsets = mm[off_start:off_start + off_size].view(np.int64).tolist()
+    raw = mm[data_start:data_start + data_size].tobytes()
+    values = [raw[a:b].decode('utf-8') for a, b in zip(offsets[:-1], offsets[1:])]
+    if column.get('nulls') is not None:
+        n_start, n_size = table[column['nulls']]
+        for i in np.flatnonzero(mm[n_start:n_start + n_size].view(bool)):
+            values[i] = None
+    return values
+
+
+def _text_values(mm, table, column, rows):
+    off_start, off_size = table[column['offsets']]
+    data_start, data_size = table[column['data']]
+    offsets = mm[off_start:off_start + off_size].view(np.int64)
+    blob = mm[data_start:data_start + data_size]
+    nulls = None
+    if column.get('nulls') is not None:
+        n_start, n_size = table[column['nulls']]
+        nulls = mm[n_start:n_start + n_size].view(bool)
+
+    if pa is not None and column['kind'] == 'text':
+        validity = None if nulls is None else pa.py_buffer(np.packbits(~nulls, bitorder='little'))
+        arr = pa.LargeStringArray.from_buffers(
+            rows, pa.py_buffer(offsets), pa.py_buffer(blob), validity
+        )
+        return pd.arrays.ArrowExtensionArray(pa.chunked_array([arr]))
+
+    values = _decode_text(mm, table, column)
+    if column['kind'] == 'json':
+        return pd.Series([None if v is None else json.loads(v) for v in values], dtype=object)
+    return pd.Series(values, dtype=object)
+
+
+def _open(path, signature):
+    """Memory-map a snapshot file: (map, header, segment table), or None if missing or stale"""
+    try:
+        mm = np.memmap(path, dtype=np.uint8, mode='r')
+        header, table = _read_header(mm)
+    except (OSError, ValueError):
+        return None
+    if header['format'] != FORMAT_VERSION or (signature is not None and header['source'] != signature):
+        return None
+    return mm, header, table
+
+
+def read_snapshot(csv_path, variant, signature=None):
+    """Load the snapshot of ``csv_path``; ``None`` if missing or stale"""
+    try:
+        signature = signature or _source_signature(csv_path)
+    except OSError:
+        return None
+    return map_snapshot(snapshot_path(csv_path, variant), signature)
+
+
+def read_delta(csv_path, variant, signature=None):
+    """The row changes recorded with the snapshot of ``csv_path`` (see ``SnapshotWriter.close``)
+
+    ``None`` if the snapshot is missing or stale or was not written with one.
+    """
+    try:
+        opened = _open(snapshot_path(csv_path, variant), signature or _source_signature(csv_path))
+    except OSError:
+        return None
+    if opened is None or 'delta' not in opened[1]:
+        return None
+    mm, header, table = opened
+    delta = dict(header['delta'])
+    for key in ('removed', 'changed'):
+        start, size = table[delta[key]]
+        delta[key] = np.array(mm[start:start + size].view(np.int64))
+    return delta
+
+
+def map_snapshot(path, signature=None):
+    """Memory-map the snapshot file at ``path`` as a frame
+
+    ``None`` if it is missing or unreadable, or if ``signature`` is given and
+    differs from the source signature it was written with.
+    """
+    opened = _open(path, signature)
+    if opened is None:
+        return None
+    mm, header, table = opened
+
+    rows = header['rows']
+    data = {}
+    for column in header['columns']:
+        if column['kind'] == 'array':
+            start, size = table[column['data']]
+            data[column['name']] = mm[start:start + size].view(np.dtype(column['dtype']))
+        elif column['kind'] == 'category':
+            start, size = table[column['codes']]
+            codes = mm[start:start + size].view(np.dtype(column['dtype']))
+            categories = _decode_text(mm, table, column)
+            data[column['name']] = pd.Categorical.from_codes(codes, categories=categories, validate=False)
+        else:
+            data[column['name']] = _text_values(mm, table, column, rows)
+    return pd.DataFrame(data, copy=False)
+
+
+def load_cached(csv_path, variant, loader, signature=None):
+    """Load ``csv_path`` from its snapshot, or via ``loader`` and snapshot it"""
+    signature = signature or _source_signature(csv_path)
+    df = read_snapshot(csv_path, variant, signature)
+    if df is not None:
+        return df
+    df = loader(csv_path)
+    try:
+        write_snapshot(df, csv_path, variant, signature)
+    except (OSError, TypeError, ValueError):
+        # Read-only deployments (or unsupported column types) still work,
+        # they just parse the CSV
+        return df
+    # Serve the mapped copy, so even the first load drops the parsed objects
+    mapped = read_snapshot(csv_path, variant, signature)
+    return df if mapped is None else mapped
+
+
+def main():
+    from places_store import DATA_FILE, SNAPSHOT_VARIANT, load_places
+
+    parser = argparse.ArgumentParser(description='Compile places CSV files into binary snapshots.')
+    parser.add_argument('csv', nargs='*', default=[DATA_FILE])
+    args = parser.parse_args()
+    for csv_path in args.csv:
+        path = write_snapshot(load_places(csv_path), csv_path, SNAPSHOT_VARIANT)
+        print(f'{csv_path} -> {path} ({os.path.getsize(path):,} bytes)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,543 @@
+"""Process-wide places store, shared by the API and the Streamlit app.
+
+This module owns the places data for both frontends: reading the CSV,
+validating and normalizing its columns (``read_places``), the compact
+snapshot, and the indexes built over it (``PlacesData``).
+
+The places file is parsed once and kept in memory. Every access checks the
+file's mtime/size (at most once per ``check_interval`` seconds) and, when it
+has changed, builds a complete new ``PlacesData`` before swapping it in, so a
+request that already holds a ``PlacesData`` never sees a half-built frame.
+
+When the change came from ``ingest.py``, the new snapshot records which rows
+it removed, rewrote and appended relative to the file this store has loaded.
+The new ``PlacesData`` is then built from the current one: its indexes and
+record cache are updated for just those rows (see ``places_delta``) rather
+than rebuilt over the whole catalogue.
+"""
+import ast
+import base64
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from geo_index import GeoIndex, parse_coordinates
+from metrics import PHASE_SECONDS
+from places_columns import RecordStore, compact_frame
+from places_delta import RowDelta, merge_sorted
+from places_index import PlacesIndex
+from places_snapshot import load_cached, read_delta
+from planner import AVG_SPEED_KMH, VISIT_HOURS, WeekendPlanner, slot_labels
+from sampling import PlaceSampler
+from search_index import SearchIndex
+from responses import encode
+
+# PLACES_DATA_FILE, else the expanded catalogue when present, else places.csv
+DATA_FILE = os.environ.get('PLACES_DATA_FILE') or (
+    'places_expand.csv' if os.path.exists('places_expand.csv') else 'places.csv'
+)
+
+# Snapshot name for frames produced by load_places(); bump it whenever
+# load_places() output changes so existing snapshots are rebuilt
+SNAPSHOT_VARIANT = 'places-4'
+
+# Columns every normalized frame has; missing ones are added
+REQUIRED_COLUMNS = [
+    'id', 'place_name', 'category', 'subcategory', 'description', 'location',
+    'facts', 'rules', 'spooky', 'distance_from_pune_km', 'best_time_to_visit', 'map_link',
+]
+TEXT_COLUMNS = [
+    'place_name', 'category', 'subcategory', 'description', 'location',
+    'facts', 'rules', 'best_time_to_visit', 'map_link',
+]
+
+# Page size bounds for cursor pagination
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Encoded records kept per data version for lookups by id
+ENCODED_CACHE_SIZE = 4096
+
+# Deltas kept for a search index that has not been needed since; past this
+# many versions it is rebuilt on first use instead
+MAX_PENDING_DELTAS = 8
+
+
+def normalize_places(df):
+    """Validate and coerce the columns of a raw places frame, in place
+
+    Afterwards every REQUIRED_COLUMNS column exists, text columns hold
+    strings ('' when missing), ``spooky`` is boolean, distances are floats
+    (NaN when unknown) and ids are integers where the file has them.
+    """
+    df.columns = [str(c).strip() for c in df.columns]
+    if 'subcategory' not in df.columns and 'category' in df.columns:
+        df['subcategory'] = df['category']
+    for col in REQUIRED_COLUMNS:
+        if col not in df.columns:
+            df[col] = pd.NA
+
+    # Accept values like '25 km'
+    distance = df['distance_from_pune_km']
+    if not pd.api.types.is_numeric_dtype(distance):
+        distance = pd.to_numeric(
+            distance.astype(str).str.extract(r'([0-9]*\.?[0-9]+)', expand=False), errors='coerce'
+        )
+    df['distance_from_pune_km'] = distance.astype(float)
+
+    if not pd.api.types.is_bool_dtype(df['spooky']):
+        df['spooky'] = df['spooky'].astype(str).str.strip().str.lower().isin(['true', '1', 'yes', 'y'])
+
+    for col in TEXT_COLUMNS:
+        df[col] = df[col].fillna('').astype(str)
+
+    ids = pd.to_numeric(df['id'], errors='coerce')
+    if len(df) and ids.notna().all() and (ids % 1 == 0).all():
+        df['id'] = ids.astype('int64')
+    elif df['id'].isna().all():
+        df['id'] = np.arange(1, len(df) + 1)
+    else:
+        df['id'] = df['id'].astype(str)
+    return df
+
+
+def read_places(path):
+    """Parse the places CSV into a normalized DataFrame"""
+    try:
+        df = pd.read_csv(path)
+    except UnicodeDecodeError:
+        # Older hand-edited exports are Latin-1
+        df = pd.read_csv(path, encoding='ISO-8859-1')
+    normalize_places(df)
+    return add_coordinates(df)
+
+
+def add_coordinates(df):
+    """Turn ``coordinates`` into [lat, lng] lists (None where unknown), in place"""
+    # Convert coordinates string to list (only present in some exports),
+    # otherwise take lat/lng from the map link where it has them
+    if 'coordinates' in df.columns:
+        df['coordinates'] = df['coordinates'].apply(
+            lambda v: ast.literal_eval(v) if isinstance(v, str) and v.strip()
+            else list(v) if isinstance(v, (list, tuple)) else None
+        )
+    else:
+        df['coordinates'] = df['map_link'].apply(parse_coordinates)
+    return df
+
+
+def load_places(path):
+    """Parse the places CSV into the compact frame ``PlacesData`` is built from"""
+    return compact_frame(read_places(path))
+
+
+def _native(value):
+    """Turn pandas/numpy scalars into JSON-friendly Python values"""
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if value is pd.NA or value is pd.NaT:
+        return None
+    return value
+
+
+def encode_cursor(place_id):
+    """Opaque pagination cursor pointing just after ``place_id``"""
+    raw = json.dumps({'after': place_id}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the id a cursor points after; raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        after = json.loads(raw)['after']
+    except Exception:
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+    # Ids are integers or strings; bool is an int subclass but never an id
+    if isinstance(after, bool) or not isinstance(after, (int, str)):
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+    return after
+
+
+class PlacesData:
+    """One immutable, fully built version of the places data
+
+    With ``previous`` (the version ``df`` was derived from) and the
+    ``RowDelta`` between them, indexes are updated from ``previous`` for the
+    changed rows only.
+    """
+
+    def __init__(self, df, version, previous=None, delta=None):
+        if 'coordinates' in df.columns:
+            df = compact_frame(df.copy(deep=False))
+        if previous is None or delta is None or delta.old_size != len(previous) or delta.size != len(df):
+            previous = delta = None
+        self.df = df
+        self.version = version
+        # Records are built from the columns on demand, never kept per row
+        self.records = RecordStore(df)
+        self.fields = self.records.fields
+        self.index = PlacesIndex(df, getattr(previous, 'index', None), delta)
+        self.geo = GeoIndex(df['lat'].to_numpy(dtype=float), df['lng'].to_numpy(dtype=float),
+                            previous=getattr(previous, 'geo', None), delta=delta)
+        # Pages are ordered by id so cursors stay valid across reloads
+        self.ids = df['id'].to_numpy()
+        self.ids_sorted = df['id'].is_monotonic_increasing
+        # id -> row position by binary search over the sorted ids
+        if self.ids_sorted:
+            self._id_order = None
+            self._ids_by_value = self.ids
+        elif previous is None or self.ids.dtype != previous.ids.dtype:
+            self._id_order = np.argsort(self.ids, kind='stable')
+            self._ids_by_value = self.ids[self._id_order]
+        else:
+            # Rewritten rows keep their id, so only removed and appended rows move
+            order = np.arange(len(previous)) if previous._id_order is None else previous._id_order
+            carried = delta.moved[order]
+            carried = carried[carried >= 0]
+            self._ids_by_value, self._id_order = merge_sorted(self.ids[carried], carried,
+                                                              self.ids[delta.appended], delta.appended)
+        # Most recently looked-up records, encoded to JSON
+        self._encoded = OrderedDict()
+        self._encoded_lock = threading.Lock()
+        if previous is not None:
+            with previous._encoded_lock:
+                cached = list(previous._encoded.items())
+            for pos, body in cached:
+                if delta.unchanged[pos]:
+                    self._encoded[int(delta.moved[pos])] = body
+        self._search = None
+        # (index, [(df, delta), ...]) to bring a previous search index up to date
+        self._search_updates = None
+        if previous is not None:
+            if previous._search is not None:
+                self._search_updates = (previous._search, [(df, delta)])
+            elif previous._search_updates is not None:
+                base, pending = previous._search_updates
+                if len(pending) < MAX_PENDING_DELTAS:
+                    self._search_updates = (base, pending + [(df, delta)])
+        self._planner = None
+        self._sampler = None
+        self._lazy_lock = threading.Lock()
+        self._categories = None
+        self._stats = None
+
+    def __len__(self):
+        return len(self.records)
+
+    def position(self, place_id):
+        """Row position of the place with ``place_id``, or None"""
+        ids = self._ids_by_value
+        try:
+            # The last row wins when an id repeats
+            i = int(np.searchsorted(ids, place_id, side='right')) - 1
+        except TypeError:
+            return None
+        if i < 0 or ids[i] != place_id:
+            return None
+        return i if self._id_order is None else int(self._id_order[i])
+
+    def select(self, category=None, max_distance=None, spooky=None, subcategory=None):
+        """Row positions matching the given filters, in file order"""
+        start = time.perf_counter()
+        positions = self.index.select(
+            categories=category or None,
+            subcategories=subcategory or None,
+            max_distance=max_distance,
+            spooky=spooky,
+        )
+        PHASE_SECONDS.observe(time.perf_counter() - start, 'filter')
+        return positions
+
+    def facets(self, category=None, max_distance=None, spooky=None, subcategory=None) -> dict:
+        """Facet counts for a filter combination (see ``PlacesIndex.facets``)"""
+        start = time.perf_counter()
+        facets = self.index.facets(
+            categories=category or None,
+            subcategories=subcategory or None,
+            max_distance=max_distance,
+            spooky=spooky,
+        )
+        PHASE_SECONDS.observe(time.perf_counter() - start, 'filter')
+        return facets
+
+    def page(self, positions, limit, after=None):
+        """Slice one page of row positions in id order
+
+        Returns the positions on the page and the cursor for the next page
+        (``None`` on the last page). ``after`` is the id decoded from the
+        previous page's cursor.
+        """
+        if not self.ids_sorted:
+            positions = positions[np.argsort(self.ids[positions], kind='stable')]
+        start = 0
+        if after is not None:
+            # A cursor from integer ids does not fit string ids, or the reverse
+            if isinstance(after, int) != np.issubdtype(self.ids.dtype, np.integer):
+                raise ValueError(f'Invalid cursor position: {after!r}')
+            start = int(np.searchsorted(self.ids[positions], after, side='right'))
+        chunk = positions[start:start + limit]
+        has_more = start + limit < len(positions)
+        next_cursor = encode_cursor(_native(self.ids[chunk[-1]])) if has_more else None
+        return chunk, next_cursor
+
+    def project(self, positions, fields=None) -> list:
+        """Records at the given positions, limited to ``fields`` if given"""
+        return self.records.take(positions, fields)
+
+    def iter_ndjson(self, positions, chunk_size=1 << 16, batch_rows=1024):
+        """Yield the records at ``positions`` as NDJSON, in ~chunk_size pieces
+
+        Encodings are not memoized here, so an export holds at most one
+        chunk of output (and one batch of records) in memory however many
+        rows it covers.
+        """
+        buf = []
+        size = 0
+        for start in range(0, len(positions), batch_rows):
+            for record in self.records.take(positions[start:start + batch_rows]):
+                line = encode(record)
+                buf.append(line)
+                size += len(line) + 1
+                if size >= chunk_size:
+                    yield b'\n'.join(buf) + b'\n'
+                    buf = []
+                    size = 0
+        if buf:
+            yield b'\n'.join(buf) + b'\n'
+
+    def nearby(self, lat, lng, k=10, radius_km=None) -> list:
+        """Up to ``k`` places closest to (lat, lng), nearest first"""
+        positions, distances = self.geo.query(lat, lng, k, radius_km)
+        return [
+            dict(record, distance_km=round(float(d), 3))
+            for record, d in zip(self.records.take(positions), distances)
+        ]
+
+    @property
+    def search_index(self) -> SearchIndex:
+        """Full-text index, built (or updated from the previous version's) on first use"""
+        if self._search is None:
+            with self._lazy_lock:
+                if self._search is None:
+                    if self._search_updates is None:
+                        self._search = SearchIndex(self.df)
+                    else:
+                        index, pending = self._search_updates
+                        for df, delta in pending:
+                            index = SearchIndex(df, previous=index, delta=delta)
+                        self._search = index
+                        self._search_updates = None
+        return self._search
+
+    def search(self, query, limit=10, prefix=True) -> list:
+        """Best full-text matches for ``query``, each with its score"""
+        positions, scores = self.search_index.search(query, limit, prefix)
+        return [
+            dict(record, score=round(float(s), 4))
+            for record, s in zip(self.records.take(positions), scores)
+        ]
+
+    @property
+    def planner(self) -> WeekendPlanner:
+        """Itinerary planner with its distance matrix, built on first use for this data version"""
+        if self._planner is None:
+            with self._lazy_lock:
+                if self._planner is None:
+                    self._planner = WeekendPlanner(self.df)
+        return self._planner
+
+    def plan(self, categories=None, spooky=None, start=None, hours=None, km=None, max_stops=6) -> dict:
+        """Ordered round-trip itinerary within the budget, grouped by time of day"""
+        # A stop farther out than half the budget can never fit a round trip from Pune
+        reach = None
+        if start is None:
+            if km is not None:
+                reach = km / 2
+            if hours is not None:
+                by_time = max(hours - VISIT_HOURS, 0) * AVG_SPEED_KMH / 2
+                reach = by_time if reach is None else min(reach, by_time)
+        positions = self.select(categories, None, spooky)
+        if reach is not None:
+            positions = positions[self.planner.radius[positions] <= reach]
+
+        result = self.planner.plan(positions, start, hours, km, max_stops)
+        labels = slot_labels(self.planner.slots[result['stops']].tolist())
+        stops = [
+            dict(record, time_of_day=label, leg_km=round(leg, 3))
+            for record, label, leg in zip(self.records.take(result['stops']), labels, result['legs'])
+        ]
+        groups = []
+        for stop in stops:
+            if not groups or groups[-1]['time_of_day'] != stop['time_of_day']:
+                groups.append({'time_of_day': stop['time_of_day'], 'place_ids': []})
+            groups[-1]['place_ids'].append(stop['id'])
+        return {
+            'stops': stops,
+            'groups': groups,
+            'return_km': round(result['return_km'], 3),
+            'total_km': round(result['total_km'], 3),
+            'total_hours': round(result['total_hours'], 2),
+            'estimated': result['estimated'],
+        }
+
+    def place_json(self, place_id) -> bytes | None:
+        """Return the JSON-encoded record with the given id, or None"""
+        pos = self.position(place_id)
+        return None if pos is None else self.record_json(pos)
+
+    def record_json(self, pos) -> bytes:
+        """JSON-encoded record at a row position (LRU-cached)"""
+        with self._encoded_lock:
+            body = self._encoded.get(pos)
+            if body is not None:
+                self._encoded.move_to_end(pos)
+                return body
+        body = encode(self.records[pos])
+        with self._encoded_lock:
+            self._encoded[pos] = body
+            while len(self._encoded) > ENCODED_CACHE_SIZE:
+                self._encoded.popitem(last=False)
+        return body
+
+    def lookup(self, place_ids) -> tuple:
+        """Positions of the given ids in request order, and the ids not found
+
+        Repeated ids are returned once.
+        """
+        positions, missing, seen = [], [], set()
+        for place_id in place_ids:
+            if place_id in seen:
+                continue
+            seen.add(place_id)
+            pos = self.position(place_id)
+            if pos is None:
+                missing.append(place_id)
+            else:
+                positions.append(pos)
+        return positions, missing
+
+    @property
+    def sampler(self) -> PlaceSampler:
+        """Random place sampler for this data version, built on first use"""
+        if self._sampler is None:
+            with self._lazy_lock:
+                if self._sampler is None:
+                    self._sampler = PlaceSampler(self.df, self.index)
+        return self._sampler
+
+    def random_places(self, n=1, weighting='uniform', seed=None, cursor=0,
+                      category=None, max_distance=None, spooky=None, subcategory=None) -> dict:
+        """Up to ``n`` distinct random places matching the filters
+
+        Without a seed the draw is fresh every call. With one, places come
+        from a seeded shuffle starting at ``cursor``; the result's
+        ``next_cursor`` continues it without repeats.
+        """
+        filtered = any(v is not None for v in (category, max_distance, spooky, subcategory))
+        positions = self.select(category, max_distance, spooky, subcategory) if filtered else None
+        if seed is None:
+            picks = self.sampler.sample(positions, n, weighting)
+            next_cursor = None
+        else:
+            key = (category, max_distance, spooky, subcategory)
+            picks, next_cursor = self.sampler.sequence(seed, cursor, n, positions, weighting, key)
+        return {'places': self.records.take(picks), 'next_cursor': next_cursor}
+
+    def categories(self) -> list:
+        """Sorted list of distinct categories"""
+        if self._categories is None:
+            self._categories = sorted(self.df['category'].unique().tolist())
+        return self._categories
+
+    def stats(self) -> dict:
+        """Summary statistics over the whole dataset"""
+        if self._stats is None:
+            # Counts come from one facet pass over the index codes
+            facets = self.index.facets()
+            distance = self.df['distance_from_pune_km']
+            self._stats = {
+                'total_places': facets['total'],
+                'categories': {k: n for k, n in facets['category'].items() if n},
+                'spooky_places': facets['spooky']['true'],
+                'non_spooky_places': facets['spooky']['false'],
+                'avg_distance': float(distance.mean()),
+                'max_distance': float(distance.max()),
+                'min_distance': float(distance.min()),
+                'best_times': {k: n for k, n in facets.get('best_time_to_visit', {}).items() if n}
+            }
+        return self._stats
+
+
+class PlacesStore:
+    """Loads the places file once and hot-reloads it when it changes"""
+
+    def __init__(self, path=DATA_FILE, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._data = None
+        self._signature = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def current(self) -> PlacesData:
+        """Return the current data, reloading first if the file changed"""
+        data = self._data
+        now = time.monotonic()
+        if data is not None and now < self._next_check:
+            return data
+        with self._lock:
+            if self._data is not None and now < self._next_check:
+                return self._data
+            try:
+                signature = self._stat()
+            except OSError:
+                if self._data is None:
+                    raise
+                # Keep serving the last good version while the file is missing
+                self._next_check = now + self.check_interval
+                return self._data
+            if signature != self._signature or self._data is None:
+                self._reload(signature)
+            self._next_check = now + self.check_interval
+            return self._data
+
+    def _delta(self, source):
+        """The ``RowDelta`` from the loaded version to ``source``, if an ingest recorded one"""
+        if self._data is None:
+            return None
+        change = read_delta(self.path, SNAPSHOT_VARIANT, source)
+        mtime_ns, size = self._signature
+        if change is None or change['base'] != {'mtime_ns': mtime_ns, 'size': size}:
+            return None
+        return RowDelta(change['rows'], change['removed'], change['changed'], change['appended'])
+
+    def _reload(self, signature):
+        try:
+            with PHASE_SECONDS.time('load'):
+                mtime_ns, size = signature
+                source = {'mtime_ns': mtime_ns, 'size': size}
+                df = load_cached(self.path, SNAPSHOT_VARIANT, load_places, source)
+                version = '%x-%x' % signature
+                data = PlacesData(df, version, self._data, self._delta(source))
+        except Exception:
+            if self._data is None:
+                raise
+            # A half-written file should not take down a working store
+            return
+        self._data = data
+        self._signature = signature
+        self.reloads += 1
@@ -0,0 +1,255 @@
+"""Weekend itinerary planning.
+
+``WeekendPlanner`` turns a set of candidate places into an ordered round
+trip from a start point that fits a time and/or distance budget:
+
+1. Cheapest insertion: stops are added one at a time, each at the position
+   in the route where it adds the least distance, until the budget (or the
+   stop limit) is used up.
+2. 2-opt: segments of the route are reversed while that shortens it.
+
+Stops are kept in time-of-day order (Early Morning -> Morning -> Afternoon
+-> Evening -> Sunset -> Night) from their ``best_time_to_visit``; places
+without a time of day (Anytime, Monsoon) can go anywhere.
+
+Most rows only know their distance from Pune, not coordinates. A leg between
+two points with coordinates is the great-circle distance; otherwise it is
+estimated as sqrt(a^2 + b^2) from the two distances to Pune, the expected
+(RMS) distance between them over all bearings. Pairwise distances are
+precomputed once per dataset for catalogues up to ``MATRIX_MAX_ROWS`` rows
+and computed per route row beyond that.
+"""
+import math
+import re
+
+import numpy as np
+
+from geo_index import haversine_km, parse_coordinates
+
+PUNE = (18.5204, 73.8567)
+
+TIME_SLOTS = ['Early Morning', 'Morning', 'Afternoon', 'Evening', 'Sunset', 'Night']
+ANYTIME = 'Anytime'
+
+# Average road speed and time spent at each stop, for hour budgets
+AVG_SPEED_KMH = 40.0
+VISIT_HOURS = 1.5
+
+DEFAULT_MAX_STOPS = 6
+MAX_STOPS = 12
+
+# Largest catalogue whose full distance matrix is kept in memory (~16 MB)
+MATRIX_MAX_ROWS = 2048
+
+_SLOT_PATTERNS = [
+    (0, re.compile(r'early\s+morning|dawn|sunrise')),
+    (1, re.compile(r'morning')),
+    (2, re.compile(r'afternoon|noon')),
+    (3, re.compile(r'evening')),
+    (4, re.compile(r'sunset|dusk')),
+    (5, re.compile(r'night')),
+]
+
+
+def time_slot(text):
+    """Index into TIME_SLOTS for a ``best_time_to_visit`` value, or -1 if any time
+
+    The earliest-mentioned time wins, so "Morning/Evening" is a morning stop.
+    """
+    if not isinstance(text, str):
+        return -1
+    text = text.lower()
+    best, best_at = -1, len(text) + 1
+    for slot, pattern in _SLOT_PATTERNS:
+        match = pattern.search(text)
+        if match and match.start() < best_at:
+            best, best_at = slot, match.start()
+    return best
+
+
+class WeekendPlanner:
+    """Route planner over the rows of a places frame"""
+
+    def __init__(self, df):
+        n = len(df)
+        self.size = n
+        if 'lat' in df.columns and 'lng' in df.columns:
+            self.lats = df['lat'].to_numpy(dtype=float)
+            self.lngs = df['lng'].to_numpy(dtype=float)
+        else:
+            if 'coordinates' in df.columns:
+                coordinates = df['coordinates'].tolist()
+            else:
+                coordinates = [parse_coordinates(link) for link in df['map_link'].tolist()]
+            self.lats = np.full(n, np.nan)
+            self.lngs = np.full(n, np.nan)
+            for i, coords in enumerate(coordinates):
+                if coords is not None and len(coords) == 2:
+                    self.lats[i], self.lngs[i] = coords
+        self.has_coords = ~np.isnan(self.lats)
+
+        radius = df['distance_from_pune_km'].to_numpy(dtype=float, na_value=np.nan)
+        # Fall back to the straight-line distance where only coordinates are known
+        missing = np.isnan(radius) & self.has_coords
+        if missing.any():
+            radius[missing] = haversine_km(PUNE[0], PUNE[1], self.lats[missing], self.lngs[missing])
+        self.radius = radius
+        self.routable = ~np.isnan(radius)
+        self.slots = np.array([time_slot(t) for t in df['best_time_to_visit'].tolist()], dtype=np.int8)
+
+        self.matrix = None
+        if n <= MATRIX_MAX_ROWS:
+            self.matrix = np.vstack([
+                self._from_point(self.lats[i], self.lngs[i], self.radius[i]) for i in range(n)
+            ]).astype(np.float32) if n else np.empty((0, 0), dtype=np.float32)
+
+    def _from_point(self, lat, lng, radius, positions=None):
+        """Estimated km from one point to the rows at ``positions`` (default: all)"""
+        if positions is None:
+            positions = slice(None)
+        r = self.radius[positions]
+        dist = np.sqrt(radius * radius + r * r)
+        if not math.isnan(lat):
+            exact = self.has_coords[positions]
+            if exact.any():
+                dist[exact] = haversine_km(lat, lng, self.lats[positions][exact], self.lngs[positions][exact])
+        return dist
+
+    def _row(self, pos, positions):
+        if self.matrix is not None:
+            return self.matrix[pos, positions].astype(float)
+        return self._from_point(self.lats[pos], self.lngs[pos], self.radius[pos], positions)
+
+    def plan(self, positions, start=None, hours=None, km=None, max_stops=DEFAULT_MAX_STOPS):
+        """Plan a round trip through some of the candidate row ``positions``
+
+        Returns a dict with ``stops`` (row positions in visiting order),
+        ``legs`` (km to each stop from the previous one), ``return_km``,
+        ``total_km``, ``total_hours`` and ``estimated`` (True if any leg
+        lacked coordinates at either end).
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        positions = positions[self.routable[positions]]
+        max_stops = min(max(int(max_stops), 1), MAX_STOPS)
+
+        if start is None:
+            start_lat, start_lng = PUNE
+            start_radius = 0.0
+        else:
+            start_lat, start_lng = start
+            start_radius = float(haversine_km(PUNE[0], PUNE[1], np.array([start_lat]), np.array([start_lng]))[0])
+        from_start = self._from_point(start_lat, start_lng, start_radius, positions)
+        slots = self.slots[positions]
+
+        def fits(total_km, stops):
+            if km is not None and total_km > km:
+                return False
+            if hours is not None and total_km / AVG_SPEED_KMH + stops * VISIT_HOURS > hours:
+                return False
+            return True
+
+        # Greedy cheapest insertion; route holds indexes into ``positions``
+        route = []
+        rows = []
+        used = np.zeros(len(positions), dtype=bool)
+        length = 0.0
+        while len(route) < max_stops and not used.all():
+            fixed = [int(slots[i]) for i in route]
+            best_cost = np.full(len(positions), np.inf)
+            best_at = np.zeros(len(positions), dtype=np.intp)
+            for k in range(len(route) + 1):
+                prev_row = from_start if k == 0 else rows[k - 1]
+                next_row = from_start if k == len(route) else rows[k]
+                if k == 0:
+                    gap = 0.0 if not route else from_start[route[0]]
+                elif k == len(route):
+                    gap = from_start[route[-1]]
+                else:
+                    gap = rows[k - 1][route[k]]
+                cost = prev_row + next_row - gap
+                # Keep fixed time-of-day stops in order around position k
+                lo = max([s for s in fixed[:k] if s >= 0], default=-1)
+                hi = min([s for s in fixed[k:] if s >= 0], default=len(TIME_SLOTS))
+                ok = (slots < 0) | ((slots >= lo) & (slots <= hi))
+                cost = np.where(ok & ~used, cost, np.inf)
+                better = cost < best_cost
+                best_cost[better] = cost[better]
+                best_at[better] = k
+            candidate = int(np.argmin(best_cost))
+            if not np.isfinite(best_cost[candidate]) or not fits(length + best_cost[candidate], len(route) + 1):
+                break
+            k = int(best_at[candidate])
+            route.insert(k, candidate)
+            rows.insert(k, self._row(positions[candidate], positions))
+            used[candidate] = True
+            length += float(best_cost[candidate])
+
+        route = self._two_opt(route, rows, from_start, slots)
+        legs = []
+        prev = None
+        for i in route:
+            legs.append(float(from_start[i] if prev is None else self._row(positions[prev], positions[i:i + 1])[0]))
+            prev = i
+        return_km = float(from_start[route[-1]]) if route else 0.0
+        total_km = sum(legs) + return_km
+        stops = positions[route]
+        # Legs from Pune are known exactly; any other leg needs coordinates
+        estimated = bool(len(stops)) and not self.has_coords[stops].all() and (len(stops) > 1 or start is not None)
+        return {
+            'stops': [int(p) for p in stops],
+            'legs': legs,
+            'return_km': return_km,
+            'total_km': total_km,
+            'total_hours': total_km / AVG_SPEED_KMH + len(route) * VISIT_HOURS,
+            'estimated': estimated,
+        }
+
+    def _two_opt(self, route, rows, from_start, slots):
+        """Reverse route segments while that shortens the round trip"""
+        n = len(route)
+        if n < 3:
+            return route
+        # Node 0 is the start; nodes 1..n are the stops in route order
+        d = np.empty((n + 1, n + 1))
+        d[0, 0] = 0.0
+        d[0, 1:] = d[1:, 0] = from_start[route]
+        by_stop = dict(zip(route, rows))
+        for a, i in enumerate(route, 1):
+            d[a, 1:] = by_stop[i][route]
+        tour = list(range(n + 1)) + [0]
+        stop_slots = [None] + [int(slots[i]) for i in route]
+
+        improved = True
+        while improved:
+            improved = False
+            for a in range(1, n):
+                for b in range(a + 1, n + 1):
+                    # Reversing a..b keeps time-of-day order only if the fixed
+                    # stops in it share one slot
+                    fixed = {stop_slots[t] for t in tour[a:b + 1] if stop_slots[t] >= 0}
+                    if len(fixed) > 1:
+                        continue
+                    before = d[tour[a - 1], tour[a]] + d[tour[b], tour[b + 1]]
+                    after = d[tour[a - 1], tour[b]] + d[tour[a], tour[b + 1]]
+                    if after < before - 1e-9:
+                        tour[a:b + 1] = tour[a:b + 1][::-1]
+                        improved = True
+        return [route[t - 1] for t in tour[1:-1]]
+
+
+def slot_labels(slot_values):
+    """Time-of-day label for each stop; any-time stops take their neighbours' slot"""
+    labels = [TIME_SLOTS[s] if s >= 0 else None for s in slot_values]
+    previous = None
+    for i, label in enumerate(labels):
+        if label is None:
+            labels[i] = previous
+        else:
+            previous = label
+    following = None
+    for i in range(len(labels) - 1, -1, -1):
+        if labels[i] is None:
+            labels[i] = following or ANYTIME
+        else:
+            following = labels[i]
+    return labels
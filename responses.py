@@ -0,0 +1,126 @@
+"""Helpers for building JSON responses from pre-encoded bytes.
+
+Bodies are encoded the same way ``jsonify`` does in production (sorted keys,
+ASCII, compact separators, trailing newline), so a pre-encoded response is
+byte-for-byte what the route would have produced.
+
+``ResponseCache`` keeps encoded bodies per dataset version and request, and
+``cached_response`` serves them with an ETag so clients can revalidate with
+If-None-Match. Where the per-response ``timestamp`` goes is set by the
+``PLACES_TIMESTAMP_MODE`` environment variable:
+
+* ``body`` (default) - spliced into the JSON at its sorted key position, as
+  before; the ETag is weak
+  because the bytes differ on every response
+* ``header`` - sent as an ``X-Timestamp`` header; the body and strong ETag
+  are stable
+* ``off`` - not sent at all
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import Response, request
+
+from metrics import PHASE_SECONDS
+
+TIMESTAMP_MODE = os.environ.get('PLACES_TIMESTAMP_MODE', 'body')
+
+
+def encode(obj):
+    """Encode an object to compact JSON bytes, as jsonify would"""
+    return json.dumps(obj, ensure_ascii=True, sort_keys=True, separators=(',', ':')).encode('ascii')
+
+
+def timestamp_offset(payload, body):
+    """Byte offset in ``body``, the encoding of ``payload``, where ``timestamp`` sorts"""
+    later = {key: value for key, value in payload.items() if key > 'timestamp'}
+    if not later:
+        return len(body) - 1
+    # Keys after it form the tail of the sorted encoding
+    return len(body) - len(encode(later)) + 1
+
+
+def add_timestamp(body, at=None):
+    """Insert the ``timestamp`` field into an encoded JSON object
+
+    ``at`` is the offset from ``timestamp_offset``; without it the field is
+    appended, which is only right when no key sorts after ``timestamp``.
+    Either way the body matches a freshly sorted encoding.
+    """
+    stamp = b'"timestamp":' + encode(datetime.now().isoformat())
+    if at is None or at == len(body) - 1:
+        return body[:-1] + b',' + stamp + b'}'
+    return body[:at] + stamp + b',' + body[at:]
+
+
+def bytes_response(body, status=200, headers=None):
+    """Wrap an encoded JSON body in a Flask response"""
+    return Response(body + b'\n', status=status, headers=headers, mimetype='application/json')
+
+
+class ResponseCache:
+    """LRU cache of encoded response bodies for one dataset version
+
+    Entries are dropped wholesale when a new dataset version is seen, so the
+    cache never serves data from before a reload.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, version, key, build):
+        """Return ``(body, etag, timestamp offset)`` for key, calling ``build()`` on a miss"""
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        payload = build()
+        with PHASE_SECONDS.time('serialize'):
+            body = encode(payload)
+        entry = (body, hashlib.blake2b(body, digest_size=16).hexdigest(), timestamp_offset(payload, body))
+
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def timestamped_response(body, status=200, headers=None, at=None):
+    """Respond with an encoded payload, placing the timestamp per TIMESTAMP_MODE"""
+    headers = dict(headers or {})
+    if TIMESTAMP_MODE == 'body':
+        body = add_timestamp(body, at)
+    elif TIMESTAMP_MODE == 'header':
+        headers['X-Timestamp'] = datetime.now().isoformat()
+    return bytes_response(body, status, headers)
+
+
+def cached_response(cache, version, key, build):
+    """Serve a cached JSON payload, answering If-None-Match with 304"""
+    body, etag, at = cache.get(version, key, build)
+    response = timestamped_response(body, headers={'Cache-Control': 'public, no-cache'}, at=at)
+    response.set_etag(etag, weak=TIMESTAMP_MODE == 'body')
+    return response.make_conditional(request)
@@ -0,0 +1,185 @@
+"""Random place selection.
+
+``PlaceSampler`` draws row positions under one of several weightings:
+
+* ``uniform`` - every place equally likely
+* ``nearby`` - weight 1 / (1 + distance / NEARBY_SCALE_KM), so places close
+  to Pune come up more often (unknown distances count as the farthest)
+* ``category`` - every category equally likely, then a place within it
+
+Unfiltered draws use an alias table per weighting (Vose's method), built on
+first use: O(1) per draw whatever the catalogue size. Filtered draws take
+the candidate row positions from ``PlacesIndex.select`` and pick among them
+by their cumulative weights, so no filtered frame is ever built.
+
+With a ``seed`` the draws instead walk a seeded weighted shuffle of the
+candidates: ``cursor`` is the offset into it, so a client that passes back
+each response's ``next_cursor`` sees no place twice until it has seen them
+all, and the same (seed, cursor) always gives the same places.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+WEIGHTINGS = ('uniform', 'nearby', 'category')
+
+# Distance at which the ``nearby`` weighting halves
+NEARBY_SCALE_KM = 25.0
+
+# Seeded shuffles kept per sampler (one per seed, weighting and filter)
+ORDER_CACHE_SIZE = 16
+
+
+class AliasTable:
+    """Alias table for O(1) draws from a fixed discrete distribution"""
+
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=float)
+        n = len(weights)
+        total = weights.sum()
+        if n == 0 or not total > 0:
+            raise ValueError('weights must have a positive sum')
+        scaled = (weights * (n / total)).tolist()
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, w in enumerate(scaled) if w < 1.0]
+        large = [i for i, w in enumerate(scaled) if w >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] += scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Whatever is left over is 1 up to rounding and keeps prob 1
+        self.size = n
+        self.prob = np.array(prob)
+        self.alias = np.array(alias, dtype=np.intp)
+
+    def draw(self, rng, k=1):
+        """``k`` independent draws (indexes into the weights)"""
+        i = rng.integers(0, self.size, size=k)
+        return np.where(rng.random(k) < self.prob[i], i, self.alias[i])
+
+
+class PlaceSampler:
+    """Weighted random draws over the rows of a places frame"""
+
+    def __init__(self, df, index):
+        self.size = len(df)
+        self.distance = df['distance_from_pune_km'].to_numpy(dtype=float, na_value=np.nan)
+        self.category_codes = index.category.codes
+        self.category_sizes = np.array([len(p) for p in index.category.postings], dtype=float)
+        self._weights = {}
+        self._tables = {}
+        self._orders = OrderedDict()
+        self._lock = threading.Lock()
+
+    def weights(self, weighting):
+        """Weight of every row under ``weighting``; None means uniform"""
+        if weighting not in WEIGHTINGS:
+            raise ValueError(f"Unknown weighting: {weighting!r} (use one of {', '.join(WEIGHTINGS)})")
+        if weighting == 'uniform':
+            return None
+        if weighting not in self._weights:
+            if weighting == 'nearby':
+                distance = self.distance
+                farthest = np.nanmax(distance) if (~np.isnan(distance)).any() else 0.0
+                w = 1.0 / (1.0 + np.nan_to_num(distance, nan=farthest).clip(0) / NEARBY_SCALE_KM)
+            else:
+                codes = self.category_codes
+                w = np.zeros(self.size)
+                known = codes >= 0
+                w[known] = 1.0 / self.category_sizes[codes[known]]
+            self._weights[weighting] = w
+        return self._weights[weighting]
+
+    def _table(self, weighting):
+        table = self._tables.get(weighting)
+        if table is None:
+            with self._lock:
+                table = self._tables.get(weighting)
+                if table is None:
+                    table = self._tables[weighting] = AliasTable(self.weights(weighting))
+        return table
+
+    def sample(self, positions=None, k=1, weighting='uniform', rng=None):
+        """Up to ``k`` distinct row positions, from ``positions`` if given"""
+        rng = rng or np.random.default_rng()
+        weights = self.weights(weighting)
+        size = self.size if positions is None else len(positions)
+        k = min(k, size)
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+
+        if positions is None:
+            if weights is None:
+                return rng.choice(size, size=k, replace=False) if k > 1 else rng.integers(0, size, size=1)
+            table = self._table(weighting)
+            # Redraw duplicates a few times; heavily skewed weights fall back below
+            picks = []
+            for _ in range(8):
+                for pos in table.draw(rng, k).tolist():
+                    if pos not in picks:
+                        picks.append(pos)
+                if len(picks) >= k:
+                    return np.array(picks[:k], dtype=np.intp)
+            positions = np.arange(size)
+
+        positions = np.asarray(positions, dtype=np.intp)
+        w = None if weights is None else weights[positions]
+        if w is not None:
+            if w.sum() > 0:
+                # Rows weighted zero are never drawn
+                k = min(k, int(np.count_nonzero(w)))
+            else:
+                w = None
+        if k == 1:
+            if w is None:
+                return positions[rng.integers(0, size, size=1)]
+            cumulative = np.cumsum(w)
+            i = int(np.searchsorted(cumulative, rng.random() * cumulative[-1], side='right'))
+            return positions[[min(i, size - 1)]]
+        return rng.choice(positions, size=k, replace=False, p=None if w is None else w / w.sum())
+
+    def _order(self, seed, weighting, positions, key):
+        """Seeded weighted shuffle of the candidates (cached per seed, weighting and key)"""
+        cache_key = (seed, weighting, key)
+        with self._lock:
+            order = self._orders.get(cache_key)
+            if order is not None:
+                self._orders.move_to_end(cache_key)
+                return order
+
+        candidates = np.arange(self.size) if positions is None else np.asarray(positions, dtype=np.intp)
+        rng = np.random.default_rng(seed)
+        weights = self.weights(weighting)
+        if weights is None:
+            order = rng.permutation(candidates)
+        else:
+            # Weighted sampling without replacement: sort by exponential
+            # keys E / w, so heavier rows tend to come first (zero weight: last)
+            with np.errstate(divide='ignore'):
+                keys = rng.exponential(size=len(candidates)) / weights[candidates]
+            order = candidates[np.argsort(keys, kind='stable')]
+
+        with self._lock:
+            self._orders[cache_key] = order
+            while len(self._orders) > ORDER_CACHE_SIZE:
+                self._orders.popitem(last=False)
+        return order
+
+    def sequence(self, seed, cursor=0, k=1, positions=None, weighting='uniform', key=None):
+        """``k`` places from the seeded shuffle at ``cursor``, and the cursor after them
+
+        ``key`` identifies the candidate set (e.g. the filters that produced
+        ``positions``) for caching the shuffle.
+        """
+        order = self._order(seed, weighting, positions, key)
+        if not len(order):
+            return order, 0
+        k = min(k, len(order))
+        at = cursor % len(order)
+        picks = order[(at + np.arange(k)) % len(order)]
+        return picks, (at + k) % len(order)
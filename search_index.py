@@ -0,0 +1,194 @@
+"""In-memory full-text search over places.
+
+``SearchIndex`` is an inverted index from terms to the rows containing them,
+ranked with BM25. Field matches are weighted (a hit in ``place_name`` counts
+more than one in ``rules``) before term-frequency saturation, BM25F style.
+The last query term also matches as a prefix, so partial input works for
+typeahead.
+"""
+import bisect
+import re
+from collections import defaultdict
+
+import numpy as np
+
+SEARCH_FIELDS = {
+    'place_name': 3.0,
+    'location': 1.5,
+    'description': 1.0,
+    'facts': 1.0,
+    'rules': 0.5,
+}
+
+# Cap on how many vocabulary terms one prefix may expand to
+MAX_PREFIX_TERMS = 64
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Lower-cased word tokens of a string"""
+    if not isinstance(text, str):
+        return []
+    return _TOKEN.findall(text.lower())
+
+
+class SearchIndex:
+    """BM25-ranked inverted index over the text columns of a places frame
+
+    With ``previous`` (the index of the version before ``df``) and the
+    ``RowDelta`` between them, only the rewritten and appended rows are
+    tokenized; the other postings are carried over and renumbered, and the
+    scores are recomputed for the new collection statistics.
+    """
+
+    def __init__(self, df, fields=None, k1=1.2, b=0.75, previous=None, delta=None):
+        self.fields = {f: w for f, w in (fields or SEARCH_FIELDS).items() if f in df.columns}
+        self.k1 = k1
+        self.b = b
+        self.size = len(df)
+
+        if previous is None or (previous.fields, previous.k1, previous.b) != (self.fields, k1, b):
+            self.terms = []
+            self._term_ids = {}
+            terms, rows, tf, lengths = self._count(df, np.arange(self.size))
+        else:
+            terms, rows, tf, lengths = self._update(df, previous, delta)
+        self._index(terms, rows, tf, lengths)
+
+    def _count(self, df, positions):
+        """Postings (term id, row, weighted tf) of the rows at ``positions``, and their lengths"""
+        postings = defaultdict(lambda: defaultdict(float))
+        lengths = np.zeros(len(positions), dtype=np.float32)
+        for field, weight in self.fields.items():
+            texts = df[field].take(positions).tolist()
+            for i, (pos, text) in enumerate(zip(positions.tolist(), texts)):
+                tokens = tokenize(text)
+                lengths[i] += weight * len(tokens)
+                for token in tokens:
+                    postings[token][pos] += weight
+
+        term_parts, row_parts, tf_parts = [], [], []
+        for term, docs in postings.items():
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                term_id = self._term_ids[term] = len(self.terms)
+                self.terms.append(term)
+            term_parts.append(np.full(len(docs), term_id, dtype=np.int32))
+            row_parts.append(np.fromiter(docs.keys(), dtype=np.int32, count=len(docs)))
+            tf_parts.append(np.fromiter(docs.values(), dtype=np.float32, count=len(docs)))
+        if not term_parts:
+            empty = np.empty(0, dtype=np.int32)
+            return empty, empty, np.empty(0, dtype=np.float32), lengths
+        terms, rows = np.concatenate(term_parts), np.concatenate(row_parts)
+        order = np.lexsort((rows, terms))
+        return terms[order], rows[order], np.concatenate(tf_parts)[order], lengths
+
+    def _update(self, df, previous, delta):
+        """Postings from ``previous`` for unchanged rows, merged with the fresh rows'"""
+        self.terms = list(previous.terms)
+        self._term_ids = dict(previous._term_ids)
+        terms = np.repeat(np.arange(len(previous.terms), dtype=np.int32), np.diff(previous.offsets))
+        keep = delta.unchanged[previous.rows]
+        terms = terms[keep]
+        rows = delta.moved[previous.rows[keep]].astype(np.int32)
+        tf = previous.tf[keep]
+
+        fresh_terms, fresh_rows, fresh_tf, fresh_lengths = self._count(df, delta.fresh)
+        # Both sides are sorted by (term, row), so a merge keeps that order
+        size = max(self.size, 1)
+        at = np.searchsorted(terms.astype(np.int64) * size + rows,
+                             fresh_terms.astype(np.int64) * size + fresh_rows)
+        terms = np.insert(terms, at, fresh_terms)
+        rows = np.insert(rows, at, fresh_rows)
+        tf = np.insert(tf, at, fresh_tf)
+
+        lengths = np.zeros(self.size, dtype=np.float32)
+        old = np.flatnonzero(delta.unchanged)
+        lengths[delta.moved[old]] = previous.lengths[old]
+        lengths[delta.fresh] = fresh_lengths
+
+        # Terms no row has any more are dropped, as a rebuild would
+        counts = np.bincount(terms, minlength=len(self.terms))
+        if (counts == 0).any():
+            live = counts > 0
+            terms = (np.cumsum(live) - 1).astype(np.int32)[terms]
+            self.terms = [t for t, k in zip(self.terms, live.tolist()) if k]
+            self._term_ids = {t: i for i, t in enumerate(self.terms)}
+        return terms, rows, tf, lengths
+
+    def _index(self, terms, rows, tf, lengths):
+        """Score the postings, which are sorted by (term, row)"""
+        k1, b = self.k1, self.b
+        self.rows = rows
+        self.tf = tf
+        self.lengths = lengths
+        counts = np.bincount(terms, minlength=len(self.terms))
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+
+        avg_length = float(lengths.mean()) if self.size and lengths.mean() > 0 else 1.0
+        norm = k1 * (1 - b + b * lengths / avg_length)
+
+        # Per-row BM25 contributions are precomputed, so a query only has to
+        # gather and add them up
+        idf = np.log(1 + (self.size - counts + 0.5) / (counts + 0.5))
+        tf = tf.astype(np.float64)
+        scores = (idf[terms] * tf * (k1 + 1) / (tf + norm[rows])).astype(np.float32)
+        bounds = self.offsets.tolist()
+        self.postings = {
+            term: (rows[start:end], scores[start:end])
+            for term, start, end in zip(self.terms, bounds, bounds[1:])
+        }
+        self.vocabulary = sorted(self.postings)
+
+    def expand(self, prefix):
+        """Vocabulary terms starting with ``prefix``, most common first"""
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + '\U0010ffff', start)
+        terms = self.vocabulary[start:end]
+        if len(terms) > MAX_PREFIX_TERMS:
+            terms = sorted(terms, key=lambda t: -len(self.postings[t][0]))[:MAX_PREFIX_TERMS]
+        return terms
+
+    def search(self, query, limit=10, prefix=True):
+        """Best-matching row positions and their scores, best first"""
+        tokens = tokenize(query)
+        if not tokens or not self.size:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        # Each query token contributes its best-scoring term per row, so a
+        # prefix that expands to many terms is not over-counted
+        groups = [[t] for t in tokens[:-1] if t in self.postings]
+        last = tokens[-1]
+        if prefix:
+            groups.append(self.expand(last))
+        elif last in self.postings:
+            groups.append([last])
+
+        rows_parts, score_parts = [], []
+        for terms in groups:
+            if not terms:
+                continue
+            rows = np.concatenate([self.postings[t][0] for t in terms])
+            scores = np.concatenate([self.postings[t][1] for t in terms])
+            if len(terms) > 1:
+                order = np.lexsort((-scores, rows))
+                rows, scores = rows[order], scores[order]
+                first = np.r_[True, rows[1:] != rows[:-1]]
+                rows, scores = rows[first], scores[first]
+            rows_parts.append(rows)
+            score_parts.append(scores)
+
+        if not rows_parts:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        rows = np.concatenate(rows_parts)
+        scores = np.concatenate(score_parts)
+        unique, inverse = np.unique(rows, return_inverse=True)
+        totals = np.bincount(inverse, weights=scores).astype(np.float32)
+
+        if len(unique) > limit:
+            top = np.argpartition(-totals, limit - 1)[:limit]
+            unique, totals = unique[top], totals[top]
+        order = np.lexsort((unique, -totals))
+        return unique[order], totals[order]